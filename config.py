@@ -7,7 +7,11 @@ class Settings(BaseSettings):
     azure_openai_api_key: str
     azure_openai_deployment: str
     azure_openai_api_version: str
-    
+    azure_openai_embedding_deployment: str = "text-embedding-3-small"
+    # Optional cheaper/faster deployment (e.g. a mini model) for the numeric
+    # scoring sub-task; falls back to the main deployment when unset
+    azure_openai_scoring_deployment: str = ""
+
     # Azure Document Intelligence
     azure_document_intelligence_endpoint: str
     azure_document_intelligence_key: str
@@ -21,6 +25,14 @@ class Settings(BaseSettings):
     environment: str = "development"
     debug: bool = False
     api_version: str = "v1"
+    max_upload_bytes: int = 10 * 1024 * 1024
+    max_jd_upload_bytes: int = 5 * 1024 * 1024
+    # Resumes per shared GPT call in parse_resumes_batch
+    max_parse_batch_size: int = 8
+    # Skip Document Intelligence when local extraction yields enough text
+    prefer_local_extraction: bool = True
+    # Only call the LLM parse when rule-based field extraction comes up short
+    llm_fallback_only: bool = False
     
     class Config:
         env_file = ".env"
@@ -1,26 +1,228 @@
 from typing import Optional
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, BackgroundTasks, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from models import (
     ChatRequest, ChatResponse, FinalReportRequest, 
-    FinalReport, ParsedResume, ChatMessage,
-    MCQAnswerRequest, MCQResponse, MCQQuestion, MCQOption,
-    MCQEvaluationReport
+    FinalReport, ParsedResume, ChatMessage, InterviewSession,
+    MCQAnswerRequest, MCQResponse, MCQQuestion,
+    MCQEvaluationReport, MCQ_PRIVATE_QUESTION_FIELDS,
+    ReportListPage
 )
 from services.resume_parser import resume_parser_service
 from services.ai_agent import ai_agent_service
 from services.database import database_service
 from services.mcq_agent import mcq_agent_service
+from services.coverage import coverage_evaluator
 from config import get_settings
+from cachetools import LRUCache, TTLCache
+from logging.handlers import QueueHandler, QueueListener
+import anyio.to_thread
+import asyncio
+import codecs
+import hashlib
+import logging
+import orjson
+import os
+import queue
+import tempfile
 import uvicorn
 
 settings = get_settings()
 
+def configure_logging() -> QueueListener:
+    """Route log records through a queue so the stdout write happens off the request path"""
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s")
+    )
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG if settings.debug else logging.INFO)
+    root.addHandler(QueueHandler(log_queue))
+    # PDF parsing and HTTP client libraries log per-token/per-request debug
+    # lines that would swamp the queue when the root level is low
+    for noisy in ("PyPDF2", "pypdf", "azure", "httpx", "httpcore", "openai"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
+
+_log_listener = configure_logging()
+logger = logging.getLogger(__name__)
+
+# In-process cache of hot interview sessions. A cache hit turns the two Cosmos
+# round-trips per chat turn into zero; dirty sessions are flushed to Cosmos by
+# a background task, and force-flushed when the interview completes.
+# NOTE: assumes session affinity to one worker (or WEB_CONCURRENCY=1) — with
+# multiple workers a shared store (e.g. Redis) is needed for invalidation.
+session_cache: TTLCache = TTLCache(maxsize=10_000, ttl=1800)
+dirty_sessions: set = set()
+
+# How often the background sweep writes dirty sessions back to Cosmos. A
+# crash can lose at most this window of intermediate turns - acceptable for
+# screening interviews, since completion always flushes synchronously.
+FLUSH_INTERVAL_SECONDS = float(os.getenv("SESSION_FLUSH_INTERVAL", "10"))
+
+# How many messages per session are already persisted, so flushes can PATCH
+# just the delta instead of rewriting the whole messages array
+flushed_message_counts: dict = {}
+
+# MCQ sessions are fetched per answer and per report request; cache them the
+# same way (hits stay in-process, updates write through below)
+mcq_session_cache: TTLCache = TTLCache(maxsize=10_000, ttl=1800)
+
+# Reports never change once generated, so they get plain LRU caches with no
+# TTL - a dashboard refresh is a dict lookup instead of a Cosmos round-trip
+report_cache: LRUCache = LRUCache(maxsize=5000)
+mcq_report_cache: LRUCache = LRUCache(maxsize=5000)
+
+async def get_cached_mcq_session(session_id: str):
+    """Return an MCQ session from the in-process cache, loading from Cosmos on miss"""
+    session = mcq_session_cache.get(session_id)
+    if session is None:
+        session = await database_service.get_mcq_session(session_id)
+        if session:
+            mcq_session_cache[session_id] = session
+    return session
+
+async def get_cached_session(session_id: str):
+    """Return a session from the in-process cache, loading from Cosmos on miss"""
+    session = session_cache.get(session_id)
+    if session is None:
+        session = await database_service.get_session(session_id)
+        if session:
+            session_cache[session_id] = session
+            # Everything loaded from Cosmos is persisted by definition
+            flushed_message_counts[session_id] = len(session.messages)
+    return session
+
+async def flush_session(session_id: str):
+    """Write a cached session back to Cosmos, sending only unflushed messages"""
+    session = session_cache.get(session_id)
+    if not session:
+        return
+
+    flushed = flushed_message_counts.get(session_id, 0)
+    new_messages = session.messages[flushed:]
+
+    # Cosmos PATCH caps at 10 operations per call; 3 slots go to field sets
+    if new_messages and len(new_messages) <= 7:
+        try:
+            await database_service.append_messages(
+                session_id=session_id,
+                new_messages=new_messages,
+                question_count=session.question_count,
+                is_complete=session.is_complete
+            )
+            # Advance the watermark by what was actually written - a chat
+            # turn can append to the shared list during the await, and
+            # re-reading its length here would mark those as flushed
+            flushed_message_counts[session_id] = flushed + len(new_messages)
+            return
+        except Exception as e:
+            logger.warning(f"Session patch error for {session_id}, falling back to full write: {e}")
+
+    # Full write fallback: the cached session is authoritative, so upsert
+    # it directly - no read-modify-write
+    await database_service.upsert_session(session)
+    flushed_message_counts[session_id] = flushed + len(new_messages)
+
+async def _session_flush_loop():
+    """Periodically sweep the dirty set and write sessions back to Cosmos
+
+    Flushing on a timer instead of per turn means a 6-turn interview that
+    finishes inside one interval costs one write (the synchronous flush on
+    completion) instead of six.
+    """
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+        pending = dirty_sessions.copy()
+        dirty_sessions.clear()
+        for sid in pending:
+            try:
+                await flush_session(sid)
+            except Exception as e:
+                logger.warning(f"Session flush error for {sid}: {e}")
+
+# Uploads are streamed chunk-by-chunk into a spooled temp file (memory up to
+# SPOOL_MAX_SIZE, disk beyond that) so large files never sit fully in RAM.
+UPLOAD_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 1_048_576
+
+# Whole-request fast-fail bound: a valid request can carry a max-size resume
+# plus a max-size JD, with some slack for multipart boundaries, part headers
+# and the text form fields
+MULTIPART_OVERHEAD = 64 * 1024
+MAX_REQUEST_BYTES = settings.max_upload_bytes + settings.max_jd_upload_bytes + MULTIPART_OVERHEAD
+
+def check_upload_size(upload: UploadFile, limit: int, label: str):
+    """Reject an upload before reading a single chunk when its part size is known
+
+    Starlette exposes the multipart part's size once the form is parsed;
+    spool_upload still enforces the limit mid-stream as the backstop.
+    """
+    if upload.size and upload.size > limit:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{label} exceeds the {limit} byte limit"
+        )
+
+async def spool_upload(upload: UploadFile, limit: int) -> tempfile.SpooledTemporaryFile:
+    """Stream an uploaded file into a SpooledTemporaryFile and rewind it
+
+    Enforces the caller's per-file limit while streaming, since the part
+    size isn't always known and Content-Length can lie.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    total = 0
+    while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+        total += len(chunk)
+        if total > limit:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Upload exceeds the {limit} byte limit"
+            )
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+# Allowed upload extensions, matched case-insensitively on a single splitext
+# (the old .endswith tuples rejected uppercase names like RESUME.PDF)
+_RESUME_EXT = frozenset({'.pdf', '.docx', '.doc'})
+_JD_EXT = _RESUME_EXT | {'.txt'}
+
+# Magic bytes for the formats we accept: PDF, ZIP (DOCX) and OLE (legacy DOC)
+_DOCUMENT_MAGIC = (b"%PDF-", b"PK\x03\x04", b"\xd0\xcf\x11\xe0")
+
+def sniff_document(stream) -> bool:
+    """Check the leading magic bytes instead of trusting the filename"""
+    head = stream.read(8)
+    stream.seek(0)
+    return head.startswith(_DOCUMENT_MAGIC)
+
+def decode_text_upload(stream) -> str:
+    """Decode a spooled text upload incrementally instead of one big .decode()"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    parts = []
+    while chunk := stream.read(UPLOAD_CHUNK_SIZE):
+        parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b'', final=True))
+    return ''.join(parts)
+
+# Pre-compiled pydantic-core serializers for fixed response shapes: .to_json()
+# emits JSON bytes directly instead of walking the model into a dict first
+_session_serializer = InterviewSession.__pydantic_serializer__
+_report_serializer = FinalReport.__pydantic_serializer__
+
 app = FastAPI(
     title="AI Candidate Screening API",
     description="Chat-based AI screening system for candidates",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson serializes responses in C instead of stdlib json on the event loop
+    default_response_class=ORJSONResponse
 )
 
 # CORS Configuration
@@ -32,6 +234,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress text-heavy JSON (reports, transcripts) - added after CORS so it
+# wraps the response first; tiny payloads below 1 KB are left alone
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+@app.on_event("startup")
+async def startup():
+    # Create containers on the running event loop, then start the write-behind flusher
+    await database_service.initialize()
+    asyncio.create_task(_session_flush_loop())
+
+    # Pin the worker-thread budget used by anyio.to_thread (PDF/DOCX parsing,
+    # Document Intelligence polling) so concurrent uploads don't starve it
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 40
+
+    # Pre-warm external connections so the first real request doesn't pay
+    # TCP/TLS handshake + auth-token acquisition on top of its own work.
+    # (Document Intelligence has no cheap no-op call, so it warms on first use.)
+    await database_service.ping()
+    await ai_agent_service.ping()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Drain any sessions still waiting on the periodic sweep
+    for sid in list(dirty_sessions):
+        try:
+            await flush_session(sid)
+        except Exception as e:
+            logger.warning(f"Shutdown flush error for {sid}: {e}")
+    dirty_sessions.clear()
+    await database_service.close()
+    await resume_parser_service.close()
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -43,6 +277,7 @@ async def root():
 
 @app.post("/api/upload-resume", response_model=dict)
 async def upload_resume(
+    request: Request,
     resume_file: UploadFile = File(...),
     job_description_file: UploadFile = File(default=None),
     job_description_text: Optional[str] = Form(default=None)
@@ -57,56 +292,82 @@ async def upload_resume(
     Returns parsed resume data and creates a new session
     """
     try:
+        # Fail fast on oversize requests before buffering a single chunk.
+        # Bounded by the sum of the per-file caps: a valid body can carry a
+        # max-size resume and a max-size JD at once.
+        content_length = int(request.headers.get("content-length", "0") or 0)
+        if content_length > MAX_REQUEST_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Request exceeds the {MAX_REQUEST_BYTES} byte limit"
+            )
+
         # Validate resume file type
-        if not resume_file.filename.endswith(('.pdf', '.docx', '.doc')):
+        if os.path.splitext(resume_file.filename)[1].lower() not in _RESUME_EXT:
             raise HTTPException(
                 status_code=400,
                 detail="Resume must be PDF or DOCX format"
             )
         
-        # Read and parse resume
-        resume_bytes = await resume_file.read()
-        parsed_resume = await resume_parser_service.parse_resume(
-            resume_bytes, 
-            resume_file.filename
-        )
-        
-        # Process Job Description (File or Text)
-        job_description = ""
-        
-        if job_description_file and job_description_file.filename:  # Added filename check
-            # Option 1: Job Description as File
-            if not job_description_file.filename.endswith(('.pdf', '.docx', '.doc', '.txt')):
+        has_jd_file = job_description_file and job_description_file.filename  # Added filename check
+        jd_ext = os.path.splitext(job_description_file.filename)[1].lower() if has_jd_file else ""
+        if has_jd_file:
+            if jd_ext not in _JD_EXT:
                 raise HTTPException(
                     status_code=400,
                     detail="Job description file must be PDF, DOCX, or TXT format"
                 )
-            
-            jd_bytes = await job_description_file.read()
-            
-            # Handle TXT files
-            if job_description_file.filename.endswith('.txt'):
-                job_description = jd_bytes.decode('utf-8')
-            else:
-                # Parse PDF/DOCX
-                job_description = await resume_parser_service.parse_job_description(
-                    jd_bytes,
-                    job_description_file.filename
-                )
-            
-            print(f"✓ Job description parsed from file: {job_description_file.filename}")
-            
-        elif job_description_text:
-            # Option 2: Job Description as Text
-            job_description = job_description_text
-            print(f"✓ Job description received as text ({len(job_description)} chars)")
-            
-        else:
+        elif not job_description_text:
             raise HTTPException(
                 status_code=400,
                 detail="Please provide job description either as file (job_description_file) or text (job_description_text)"
             )
-        
+
+        # Per-file caps, checked before a single byte is buffered
+        check_upload_size(resume_file, settings.max_upload_bytes, "Resume")
+        if has_jd_file:
+            check_upload_size(job_description_file, settings.max_jd_upload_bytes, "Job description")
+
+        # Stream the resume upload and verify the content matches the extension
+        resume_stream = await spool_upload(resume_file, settings.max_upload_bytes)
+        if not sniff_document(resume_stream):
+            raise HTTPException(
+                status_code=400,
+                detail="Resume file content is not a valid PDF or DOCX document"
+            )
+
+        async def resolve_job_description() -> str:
+            """Process Job Description (File or Text)"""
+            if has_jd_file:
+                jd_stream = await spool_upload(job_description_file, settings.max_jd_upload_bytes)
+
+                # Handle TXT files
+                if jd_ext == '.txt':
+                    jd = decode_text_upload(jd_stream)
+                elif not sniff_document(jd_stream):
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Job description file content is not a valid PDF or DOCX document"
+                    )
+                else:
+                    # Parse PDF/DOCX
+                    jd = await resume_parser_service.parse_job_description(
+                        jd_stream,
+                        job_description_file.filename
+                    )
+                logger.debug("Job description parsed from file: %s", job_description_file.filename)
+                return jd
+
+            logger.debug("Job description received as text (%d chars)", len(job_description_text))
+            return job_description_text
+
+        # Parse resume and JD concurrently - the two are independent until
+        # create_session, so total latency is max(t_resume, t_jd) not the sum
+        parsed_resume, job_description = await asyncio.gather(
+            resume_parser_service.parse_resume(resume_stream, resume_file.filename),
+            resolve_job_description()
+        )
+
         # Validate job description is not empty
         if not job_description or len(job_description.strip()) < 10:
             raise HTTPException(
@@ -115,7 +376,7 @@ async def upload_resume(
             )
         
         # Create new interview session
-        session_id = database_service.create_session(
+        session_id = await database_service.create_session(
             candidate_name=parsed_resume.name,
             candidate_email=parsed_resume.email,
             resume_text=parsed_resume.raw_text,
@@ -125,12 +386,16 @@ async def upload_resume(
         # Convert parsed_resume to dict with JSON-safe datetime serialization
         parsed_resume_dict = parsed_resume.model_dump()
         
+        # Compute the length once and reuse it for both response fields
+        jd_len = len(job_description)
+        jd_preview = job_description[:200] + "..." if jd_len > 200 else job_description
+
         return {
             "success": True,
             "session_id": session_id,
             "parsed_resume": parsed_resume_dict,
-            "job_description_preview": job_description[:200] + "..." if len(job_description) > 200 else job_description,
-            "job_description_length": len(job_description),
+            "job_description_preview": jd_preview,
+            "job_description_length": jd_len,
             "message": "Resume and job description processed successfully"
         }
         
@@ -139,6 +404,12 @@ async def upload_resume(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
     
+# In-flight chat turns keyed by (session_id, message digest). Clients retry
+# /api/chat when the UI lags; a duplicate retry awaits the original turn
+# instead of firing a second LLM call and racing on question_count.
+# Per-worker only - cross-worker dedup would need a shared store.
+_inflight_chats: dict = {}
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
@@ -151,12 +422,30 @@ async def chat(request: ChatRequest):
     
     Resume and JD are fetched from the database automatically.
     """
+    key = (
+        request.session_id,
+        hashlib.blake2b(request.user_message.encode(), digest_size=16).hexdigest()
+    )
+    existing = _inflight_chats.get(key)
+    if existing is not None:
+        # Duplicate retry: piggyback on the turn already in flight
+        return await asyncio.shield(existing)
+
+    task = asyncio.ensure_future(_run_chat_turn(request))
+    _inflight_chats[key] = task
+    try:
+        return await task
+    finally:
+        _inflight_chats.pop(key, None)
+
+async def _run_chat_turn(request: ChatRequest) -> ChatResponse:
+    """The actual chat turn - runs once per unique (session, message)"""
     try:
-        # Get session from database
-        session = database_service.get_session(request.session_id)
+        # Get session from cache (falls back to database)
+        session = await get_cached_session(request.session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
-        
+
         # Check if interview is already complete
         if session.is_complete:
             raise HTTPException(
@@ -164,42 +453,57 @@ async def chat(request: ChatRequest):
                 detail="Interview already completed. Please request final report."
             )
         
-        # Add user message to history
+        # Build the user message but don't touch the cached session yet: if
+        # the LLM call fails, the cache must stay as it was so a retry
+        # doesn't carry a duplicate message into every later prompt
         user_message = ChatMessage(
             sender="Candidate",
             text=request.user_message
         )
-        session.messages.append(user_message)
-        
+
+        # Early stop: after 3 answered questions, check whether the candidate's
+        # answers already cover the JD competencies - if so, jump straight to
+        # the closing message instead of paying for the remaining LLM turns
+        question_number = session.question_count
+        if 3 <= question_number < 5:
+            converged = await coverage_evaluator.answers_converged(
+                session_id=request.session_id,
+                job_description=session.job_description,
+                answer=request.user_message
+            )
+            if converged:
+                question_number = 5
+
         # Get AI response using data from session
         ai_reply = await ai_agent_service.get_next_question(
             resume=session.resume_text,
             job_description=session.job_description,
-            conversation_history=session.messages,
-            question_number=session.question_count
+            conversation_history=[*session.messages, user_message],
+            question_number=question_number,
+            session_id=request.session_id
         )
-        
-        # Add AI message to history
-        ai_message = ChatMessage(
-            sender="AI",
-            text=ai_reply
-        )
-        session.messages.append(ai_message)
-        
+
+        # LLM call succeeded - now commit the turn to the cached session
+        session.messages.append(user_message)
+        session.messages.append(ChatMessage(sender="AI", text=ai_reply))
+
         # Update question count
-        session.question_count += 1
+        session.question_count = question_number + 1
         
         # Check if interview is complete (6 questions asked - including closing message)
         is_complete = session.question_count >= 6
-        
-        # Update session in database
-        database_service.update_session(
-            session_id=request.session_id,
-            messages=session.messages,
-            question_count=session.question_count,
-            is_complete=is_complete
-        )
-        
+        session.is_complete = is_complete
+
+        # Write-behind: queue the dirty session for the background flusher,
+        # but flush synchronously once the interview is complete
+        session_cache[request.session_id] = session
+        if is_complete:
+            ai_agent_service.forget_session(request.session_id)
+            dirty_sessions.discard(request.session_id)
+            await flush_session(request.session_id)
+        else:
+            dirty_sessions.add(request.session_id)
+
         return ChatResponse(
             ai_reply=ai_reply,
             session_id=request.session_id,
@@ -212,8 +516,79 @@ async def chat(request: ChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
         
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Streaming variant of /api/chat: the reply arrives as server-sent events
+
+    Each token is sent as a `data:` event (JSON-encoded string); a final
+    `event: done` carries the same fields as ChatResponse. The session is
+    persisted through the usual write-behind path once the stream closes, so
+    perceived latency is time-to-first-token instead of the full completion.
+    """
+    session = await get_cached_session(request.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    if session.is_complete:
+        raise HTTPException(
+            status_code=400,
+            detail="Interview already completed. Please request final report."
+        )
+
+    # The user message joins the cached session only after the stream
+    # finishes - an LLM failure or mid-stream disconnect must leave the
+    # cache untouched so a retry doesn't duplicate the message
+    user_message = ChatMessage(sender="Candidate", text=request.user_message)
+
+    # Same coverage-based early stop as the non-streaming endpoint
+    question_number = session.question_count
+    if 3 <= question_number < 5:
+        converged = await coverage_evaluator.answers_converged(
+            session_id=request.session_id,
+            job_description=session.job_description,
+            answer=request.user_message
+        )
+        if converged:
+            question_number = 5
+
+    async def event_stream():
+        parts = []
+        async for token in ai_agent_service.stream_next_question(
+            resume=session.resume_text,
+            job_description=session.job_description,
+            conversation_history=[*session.messages, user_message],
+            question_number=question_number,
+            session_id=request.session_id
+        ):
+            parts.append(token)
+            yield f"data: {orjson.dumps(token).decode()}\n\n"
+
+        # Stream completed - commit the turn to the session and persist it
+        # through the same write-behind path as /api/chat
+        session.messages.append(user_message)
+        session.messages.append(ChatMessage(sender="AI", text=''.join(parts)))
+        session.question_count = question_number + 1
+        is_complete = session.question_count >= 6
+        session.is_complete = is_complete
+        session_cache[request.session_id] = session
+        if is_complete:
+            ai_agent_service.forget_session(request.session_id)
+            dirty_sessions.discard(request.session_id)
+            await flush_session(request.session_id)
+        else:
+            dirty_sessions.add(request.session_id)
+
+        done = {
+            "session_id": request.session_id,
+            "question_number": session.question_count,
+            "is_complete": is_complete
+        }
+        yield f"event: done\ndata: {orjson.dumps(done).decode()}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.post("/api/final-report", response_model=FinalReport)
-async def generate_final_report(request: FinalReportRequest):
+async def generate_final_report(request: FinalReportRequest, background_tasks: BackgroundTasks):
     """
     Endpoint 3: Generate final evaluation report
     
@@ -227,11 +602,11 @@ async def generate_final_report(request: FinalReportRequest):
     Resume, JD, and conversation history are fetched from the database automatically.
     """
     try:
-        # Get session from database
-        session = database_service.get_session(request.session_id)
+        # Get session from cache (falls back to database)
+        session = await get_cached_session(request.session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
-        
+
         # Check if at least some questions were answered (minimum 2 for meaningful evaluation)
         if session.question_count < 2:
             raise HTTPException(
@@ -239,11 +614,16 @@ async def generate_final_report(request: FinalReportRequest):
                 detail=f"Not enough data for evaluation. Only {session.question_count}/6 questions answered. Please answer at least 2 questions."
             )
         
-        # Check if report already exists
-        existing_report = database_service.get_report(request.session_id)
+        # Check if report already exists - reports are immutable, so the
+        # in-process cache is authoritative once populated
+        existing_report = report_cache.get(request.session_id)
+        if existing_report is None:
+            existing_report = await database_service.get_report(request.session_id)
+            if existing_report:
+                report_cache[request.session_id] = existing_report
         if existing_report:
             return existing_report
-        
+
         # Generate report using data from session
         report = await ai_agent_service.generate_final_report(
             candidate_name=session.candidate_name,
@@ -255,19 +635,22 @@ async def generate_final_report(request: FinalReportRequest):
         
         # Set session_id
         report.session_id = request.session_id
-        
-        # Save report to database
-        database_service.save_report(report)
-        
-        # Optionally mark session as complete if not already
+        report_cache[request.session_id] = report
+
+        # Save report after the response is sent - the client doesn't need
+        # these writes, and save_report upserts by session_id so a retry is safe
+        background_tasks.add_task(database_service.save_report, report)
+
+        # Mark the session complete and archive its transcript after the
+        # response: the report now carries the readable copy, so the session
+        # document keeps only a zstd blob of the messages
         if not session.is_complete:
-            database_service.update_session(
-                session_id=request.session_id,
-                messages=session.messages,
-                question_count=session.question_count,
-                is_complete=True
-            )
-        
+            session.is_complete = True
+            session_cache[request.session_id] = session
+        background_tasks.add_task(
+            database_service.archive_session_messages, session
+        )
+
         return report
         
     except HTTPException:
@@ -278,35 +661,37 @@ async def generate_final_report(request: FinalReportRequest):
 @app.get("/api/report/{session_id}", response_model=FinalReport)
 async def get_report(session_id: str):
     """Get existing report by session ID"""
-    report = database_service.get_report(session_id)
-    if not report:
-        raise HTTPException(status_code=404, detail="Report not found")
-    return report
+    report = report_cache.get(session_id)
+    if report is None:
+        report = await database_service.get_report(session_id)
+        if not report:
+            raise HTTPException(status_code=404, detail="Report not found")
+        report_cache[session_id] = report
+    return Response(_report_serializer.to_json(report), media_type="application/json")
 
 @app.get("/api/session/{session_id}")
 async def get_session(session_id: str):
     """Get session details"""
-    session = database_service.get_session(session_id)
+    session = await database_service.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    return session.model_dump()
+    return Response(_session_serializer.to_json(session), media_type="application/json")
 
-@app.get("/api/reports")
-async def list_reports(limit: int = 50):
-    """List all reports (for recruiter dashboard)"""
-    reports = database_service.list_all_reports(limit=limit)
-    return {"reports": [r.model_dump() for r in reports]}
+@app.get("/api/reports", response_model=ReportListPage)
+async def list_reports(limit: int = 50, continuation: Optional[str] = None):
+    """List report summaries (for recruiter dashboard), one page per call
 
-# Add these imports at the top
-from services.mcq_agent import mcq_agent_service
-from models import (
-    ChatRequest, ChatResponse, FinalReportRequest, 
-    FinalReport, ParsedResume, ChatMessage,
-    MCQAnswerRequest, MCQResponse, MCQQuestion, MCQOption,
-    MCQEvaluationReport
-)
-
-# Add these endpoints after the existing ones
+    Pass the returned continuation token back as ?continuation= to get the
+    next page. Full reports are fetched from /api/report/{session_id}.
+    """
+    reports, token = await database_service.list_all_reports(
+        limit=limit, continuation=continuation
+    )
+    return {
+        "reports": reports,
+        "limit": limit,
+        "continuation": token
+    }
 
 @app.post("/api/start-mcq-test", response_model=dict)
 async def start_mcq_test(
@@ -320,43 +705,51 @@ async def start_mcq_test(
     """
     try:
         # Validate resume file
-        if not resume_file.filename.endswith(('.pdf', '.docx', '.doc')):
+        if os.path.splitext(resume_file.filename)[1].lower() not in _RESUME_EXT:
             raise HTTPException(
                 status_code=400,
                 detail="Resume must be PDF or DOCX format"
             )
         
-        # Parse resume
-        resume_bytes = await resume_file.read()
-        parsed_resume = await resume_parser_service.parse_resume(
-            resume_bytes,
-            resume_file.filename
-        )
-        
-        # Get job description
-        job_description = ""
-        if job_description_file and job_description_file.filename:
-            if not job_description_file.filename.endswith(('.pdf', '.docx', '.doc', '.txt')):
+        has_jd_file = job_description_file and job_description_file.filename
+        jd_ext = os.path.splitext(job_description_file.filename)[1].lower() if has_jd_file else ""
+        if has_jd_file:
+            if jd_ext not in _JD_EXT:
                 raise HTTPException(
                     status_code=400,
                     detail="Job description must be PDF, DOCX, or TXT"
                 )
-            
-            jd_bytes = await job_description_file.read()
-            if job_description_file.filename.endswith('.txt'):
-                job_description = jd_bytes.decode('utf-8')
-            else:
-                job_description = await resume_parser_service.parse_job_description(
-                    jd_bytes,
-                    job_description_file.filename
-                )
-        elif job_description_text:
-            job_description = job_description_text
-        else:
+        elif not job_description_text:
             raise HTTPException(
                 status_code=400,
                 detail="Please provide job description"
             )
+
+        # Per-file caps, checked before a single byte is buffered
+        check_upload_size(resume_file, settings.max_upload_bytes, "Resume")
+        if has_jd_file:
+            check_upload_size(job_description_file, settings.max_jd_upload_bytes, "Job description")
+
+        # Stream the resume upload
+        resume_stream = await spool_upload(resume_file, settings.max_upload_bytes)
+
+        async def resolve_job_description() -> str:
+            """Get job description (file or text)"""
+            if has_jd_file:
+                jd_stream = await spool_upload(job_description_file, settings.max_jd_upload_bytes)
+                if jd_ext == '.txt':
+                    return decode_text_upload(jd_stream)
+                return await resume_parser_service.parse_job_description(
+                    jd_stream,
+                    job_description_file.filename
+                )
+            return job_description_text
+
+        # Parse resume and JD concurrently, same as upload_resume
+        parsed_resume, job_description = await asyncio.gather(
+            resume_parser_service.parse_resume(resume_stream, resume_file.filename),
+            resolve_job_description()
+        )
         
         # Generate MCQ questions
         questions = await mcq_agent_service.generate_mcq_questions(
@@ -366,7 +759,7 @@ async def start_mcq_test(
         )
         
         # Create MCQ session
-        session_id = database_service.create_mcq_session(
+        session_id = await database_service.create_mcq_session(
             candidate_name=parsed_resume.name,
             candidate_email=parsed_resume.email,
             resume_text=parsed_resume.raw_text,
@@ -374,14 +767,13 @@ async def start_mcq_test(
             questions=questions
         )
         
-        # Return first question (without correct answer)
-        first_question = questions[0]
-        mcq_question = MCQQuestion(
-            question_number=first_question['question_number'],
-            question_text=first_question['question_text'],
-            options=[MCQOption(**opt) for opt in first_question['options']],
-            category=first_question['category']
-        )
+        # Return first question (without correct answer) - the public form
+        # was stripped once at session creation
+        first_question = {
+            k: v for k, v in questions[0].items()
+            if k not in MCQ_PRIVATE_QUESTION_FIELDS
+        }
+        mcq_question = MCQQuestion.model_validate(first_question)
         
         return {
             "success": True,
@@ -403,8 +795,8 @@ async def submit_mcq_answer(request: MCQAnswerRequest):
     Submit answer for current question and get next question
     """
     try:
-        # Get session
-        session = database_service.get_mcq_session(request.session_id)
+        # Get session from cache (falls back to database)
+        session = await get_cached_mcq_session(request.session_id)
         if not session:
             raise HTTPException(status_code=404, detail="MCQ session not found")
         
@@ -429,7 +821,8 @@ async def submit_mcq_answer(request: MCQAnswerRequest):
         question_data = session.questions[question_index]
         
         # Evaluate answer
-        answer = await mcq_agent_service.evaluate_answer(
+        # Pure local computation - no await, no API call
+        answer = mcq_agent_service.evaluate_answer(
             question_data=question_data,
             selected_option=request.selected_option
         )
@@ -441,12 +834,20 @@ async def submit_mcq_answer(request: MCQAnswerRequest):
         # Check if test is complete
         is_complete = session.current_question_number >= len(session.questions)
         
-        database_service.update_mcq_session(
-            session_id=request.session_id,
-            answers=session.answers,
-            current_question_number=session.current_question_number,
-            is_complete=is_complete
-        )
+        session.is_complete = is_complete
+        mcq_session_cache[request.session_id] = session
+        # PATCH ships just the new answer and the changed scalars; fall back
+        # to a full upsert of the cached session if the delta write fails
+        try:
+            await database_service.append_mcq_answer(
+                session_id=request.session_id,
+                answer=answer,
+                current_question_number=session.current_question_number,
+                is_complete=is_complete
+            )
+        except Exception as e:
+            logger.warning(f"MCQ answer patch error for {request.session_id}, falling back to full write: {e}")
+            await database_service.upsert_mcq_session(session)
         
         # If complete, return completion message
         if is_complete:
@@ -462,13 +863,10 @@ async def submit_mcq_answer(request: MCQAnswerRequest):
                 total_questions=5
             )
         
-        # Return next question
-        next_question_data = session.questions[session.current_question_number]
-        next_question = MCQQuestion(
-            question_number=next_question_data['question_number'],
-            question_text=next_question_data['question_text'],
-            options=[MCQOption(**opt) for opt in next_question_data['options']],
-            category=next_question_data['category']
+        # Return next question from the pre-stripped public copies - no
+        # per-request option-by-option Pydantic rebuild
+        next_question = MCQQuestion.model_validate(
+            session.public_questions[session.current_question_number]
         )
         
         return MCQResponse(
@@ -490,8 +888,8 @@ async def generate_mcq_report(session_id: str):
     Called after all 5 questions are answered
     """
     try:
-        # Get session
-        session = database_service.get_mcq_session(session_id)
+        # Get session from cache (falls back to database)
+        session = await get_cached_mcq_session(session_id)
         if not session:
             raise HTTPException(status_code=404, detail="MCQ session not found")
         
@@ -501,23 +899,29 @@ async def generate_mcq_report(session_id: str):
                 detail=f"MCQ test not complete. Only {session.current_question_number}/5 questions answered."
             )
         
-        # Check if report already exists
-        existing_report = database_service.get_mcq_report(session_id)
+        # Check if report already exists - immutable once generated
+        existing_report = mcq_report_cache.get(session_id)
+        if existing_report is None:
+            existing_report = await database_service.get_mcq_report(session_id)
+            if existing_report:
+                mcq_report_cache[session_id] = existing_report
         if existing_report:
             return existing_report
-        
+
         # Generate report
         report = await mcq_agent_service.generate_evaluation_report(
             candidate_name=session.candidate_name,
             resume=session.resume_text,
             job_description=session.job_description,
-            answers=session.answers
+            answers=session.answers,
+            questions=session.questions
         )
         
         report.session_id = session_id
-        
+        mcq_report_cache[session_id] = report
+
         # Save report
-        database_service.save_mcq_report(report)
+        await database_service.save_mcq_report(report)
         
         return report
         
@@ -529,18 +933,39 @@ async def generate_mcq_report(session_id: str):
 @app.get("/api/mcq-session/{session_id}")
 async def get_mcq_session_details(session_id: str):
     """Get MCQ session details"""
-    session = database_service.get_mcq_session(session_id)
-    if not session:
+    # Completed sessions are safe to serve straight from the cache
+    session = mcq_session_cache.get(session_id)
+    if session is not None and session.is_complete:
+        return session.model_dump()
+
+    # Otherwise fetch with the answer key stripped inside the Cosmos
+    # projection - correct_option/explanation never leave the database
+    session_dict = await database_service.get_mcq_session_public(session_id)
+    if not session_dict:
         raise HTTPException(status_code=404, detail="MCQ session not found")
-    
-    # Don't expose correct answers
-    session_dict = session.model_dump()
-    if not session.is_complete:
-        for question in session_dict['questions']:
-            question.pop('correct_option', None)
-            question.pop('explanation', None)
-    
+
     return session_dict
 
 if __name__ == "__main__":
-    uvicorn.run('main:app', host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    import os
+
+    # Default to ONE worker: interview sessions are write-behind cached
+    # per process, so without session affinity or a shared store, extra
+    # workers would serve chat turns from copies up to a flush interval
+    # stale. WEB_CONCURRENCY opts in to more workers where a sticky load
+    # balancer (or external session store) makes that safe.
+    # uvloop + httptools replace the stdlib event loop / h11 parser.
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    uvicorn.run(
+        'main:app',
+        host="0.0.0.0",
+        port=8000,
+        workers=1 if settings.debug else workers,
+        loop="uvloop",
+        http="httptools",
+        reload=settings.debug,
+        log_level="debug" if settings.debug else "warning",
+        access_log=settings.debug,
+        proxy_headers=True,
+        backlog=2048
+    )
\ No newline at end of file
@@ -1,8 +1,14 @@
-from pydantic import BaseModel, Field, ConfigDict
+from __future__ import annotations
+
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
 
+def _utcnow() -> datetime:
+    """Timezone-aware replacement for the deprecated datetime.utcnow"""
+    return datetime.now(timezone.utc)
+
 # Request Models
 
 class UploadResumeRequest(BaseModel):
@@ -36,11 +42,16 @@ class ParsedResume(BaseModel):
     raw_text: str
 
 class ChatMessage(BaseModel):
-    model_config = ConfigDict(json_encoders={datetime: lambda v: v.isoformat()})
-    
     sender: str
     text: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=_utcnow)
+
+# Shared validator for raw message lists (e.g. decompressed transcripts).
+# Built once at import so callers don't pay a schema build per use.
+MESSAGE_LIST_ADAPTER = TypeAdapter(List[ChatMessage])
+
+# Validates the experience array from the AI resume parse in one pass
+EXPERIENCE_LIST_ADAPTER = TypeAdapter(List[ParsedExperience])
 
 class ChatResponse(BaseModel):
     ai_reply: str
@@ -55,8 +66,6 @@ class RecommendationType(str, Enum):
     NOT_RECOMMENDED = "Not Recommended"
 
 class FinalReport(BaseModel):
-    model_config = ConfigDict(json_encoders={datetime: lambda v: v.isoformat()})
-    
     session_id: str
     candidate_name: str
     skill_match: int = Field(ge=0, le=100)
@@ -69,12 +78,24 @@ class FinalReport(BaseModel):
     weaknesses: List[str]
     detailed_feedback: str
     transcript: List[ChatMessage]
-    generated_at: datetime = Field(default_factory=datetime.utcnow)
+    generated_at: datetime = Field(default_factory=_utcnow)
+
+class FinalReportSummary(BaseModel):
+    """Dashboard row: the projected subset of FinalReport, without the transcript"""
+    session_id: str
+    candidate_name: str
+    overall_fit: int = Field(ge=0, le=100)
+    recommendation: RecommendationType
+    generated_at: datetime
+
+class ReportListPage(BaseModel):
+    reports: List[FinalReportSummary]
+    limit: int
+    # Cosmos continuation token for the next page; None on the last page
+    continuation: Optional[str] = None
 
 # Database Models
 class InterviewSession(BaseModel):
-    model_config = ConfigDict(json_encoders={datetime: lambda v: v.isoformat()})
-    
     id: str
     session_id: str
     candidate_name: str
@@ -82,10 +103,13 @@ class InterviewSession(BaseModel):
     resume_text: str
     job_description: str
     messages: List[ChatMessage] = []
+    # base64 zstd blob of the transcript, set once the interview completes
+    # (Cosmos documents are JSON, so raw bytes can't be stored directly)
+    messages_compressed: Optional[str] = None
     question_count: int = 0
     is_complete: bool = False
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=_utcnow)
+    updated_at: datetime = Field(default_factory=_utcnow)
 
 class MCQAnswerRequest(BaseModel):
     session_id: str
@@ -117,11 +141,9 @@ class MCQAnswer(BaseModel):
     correct_option: str
     is_correct: bool
     explanation: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=_utcnow)
 
 class MCQEvaluationReport(BaseModel):
-    model_config = ConfigDict(json_encoders={datetime: lambda v: v.isoformat()})
-    
     session_id: str
     candidate_name: str
     total_questions: int = 5
@@ -133,11 +155,12 @@ class MCQEvaluationReport(BaseModel):
     cognitive_strengths: List[str]
     areas_for_improvement: List[str]
     recommendation: str
-    generated_at: datetime = Field(default_factory=datetime.utcnow)
+    generated_at: datetime = Field(default_factory=_utcnow)
+
+# Question fields that must never reach the candidate while a test is running
+MCQ_PRIVATE_QUESTION_FIELDS = frozenset({"correct_option", "explanation"})
 
 class MCQSession(BaseModel):
-    model_config = ConfigDict(json_encoders={datetime: lambda v: v.isoformat()})
-    
     id: str
     session_id: str
     candidate_name: str
@@ -145,8 +168,9 @@ class MCQSession(BaseModel):
     resume_text: str
     job_description: str
     questions: List[Dict[str, Any]] = []  # Store generated MCQ questions with correct answers
+    public_questions: List[Dict[str, Any]] = []  # Candidate-facing copies without the answer key
     answers: List[MCQAnswer] = []
     current_question_number: int = 0
     is_complete: bool = False
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    created_at: datetime = Field(default_factory=_utcnow)
+    updated_at: datetime = Field(default_factory=_utcnow)
\ No newline at end of file
@@ -1,19 +1,34 @@
-from openai import AzureOpenAI
+import logging
+from openai import NOT_GIVEN
+from cachetools import TTLCache
 from config import get_settings
-from models import ChatMessage, FinalReport, RecommendationType
+from models import ChatMessage, FinalReport, RecommendationType, _utcnow
+from services.openai_client import openai_client
 from typing import List, Dict, Any
-import json
-from datetime import datetime
+import asyncio
+import hashlib
+import orjson
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# The system prompt + resume + JD block is identical across every turn of a
+# session (and across retries sharing the same resume/JD pair), so the built
+# message prefix is cached by content digest instead of rebuilt per call.
+_prefix_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+
+# Per-session transcript already converted to chat-completion dicts, so each
+# turn appends only the new messages instead of re-walking the whole
+# conversation - O(1) prompt construction per turn instead of O(N)
+_history_cache: TTLCache = TTLCache(maxsize=10_000, ttl=1800)
 
 class AIAgentService:
+    # Bound on in-flight completions across the service, shared with the MCQ
+    # agent, so a burst of sessions doesn't trip Azure TPM/RPM limits
+    llm_semaphore = asyncio.Semaphore(10)
+
     def __init__(self):
-        self.client = AzureOpenAI(
-            azure_endpoint=settings.azure_openai_endpoint,
-            api_key=settings.azure_openai_api_key,
-            api_version=settings.azure_openai_api_version
-        )
+        self.client = openai_client
         
         self.system_prompt = """You are an AI Technical Recruiter conducting a candidate screening interview.
 
@@ -33,40 +48,84 @@ Interview Structure:
 - Question 6: Closing message thanking them and informing them about next steps
 
 Keep questions conversational and natural. Don't be too formal."""
-    
-    async def get_next_question(
-        self, 
-        resume: str, 
-        job_description: str, 
+
+    async def ping(self):
+        """Warm the Azure OpenAI connection (TLS + auth) with a 1-token request"""
+        try:
+            await self.client.chat.completions.create(
+                model=settings.azure_openai_deployment,
+                messages=[{"role": "user", "content": "ping"}],
+                max_tokens=1
+            )
+        except Exception as e:
+            logger.warning("Azure OpenAI warmup error: %s", e)
+
+    def _prompt_prefix(self, resume: str, job_description: str) -> List[Dict[str, str]]:
+        """Build (or reuse) the stable system + resume + JD message prefix
+
+        Keeping this block byte-identical and at the front of the messages list
+        also lets the provider's server-side prompt cache hit across turns.
+        """
+        key = (
+            hashlib.blake2b(resume.encode(), digest_size=20).hexdigest(),
+            hashlib.blake2b(job_description.encode(), digest_size=20).hexdigest()
+        )
+        prefix = _prefix_cache.get(key)
+        if prefix is None:
+            prefix = [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "system", "content": f"CANDIDATE RESUME:\n{resume}"},
+                {"role": "system", "content": f"JOB DESCRIPTION:\n{job_description}"}
+            ]
+            _prefix_cache[key] = prefix
+        return prefix
+
+    def _build_turn(
+        self,
+        resume: str,
+        job_description: str,
         conversation_history: List[ChatMessage],
-        question_number: int
-    ) -> str:
-        """Generate next interview question"""
-        
-        # Build conversation context
+        question_number: int,
+        session_id: str = None
+    ):
+        """Assemble (messages, history, new_turns) for one interview turn
+
+        The cached history is read but never mutated here: a failed LLM call
+        must leave cached state untouched so a retry rebuilds the turn from
+        the current transcript instead of inheriting the failed one. The
+        caller folds new_turns (plus the reply) in via _commit_turn only
+        after the call succeeds.
+        """
+
+        # Reuse the converted history for this session, converting only
+        # what's new since the previous turn; rebuild on a cache miss
+        history = _history_cache.get(session_id) if session_id else None
+        if history is None:
+            history = []
+        new_turns = [
+            {
+                "role": "assistant" if msg.sender == "AI" else "user",
+                "content": msg.text
+            }
+            for msg in conversation_history[len(history):]
+        ]
+
+        # Build conversation context. Everything that varies per turn (the
+        # question-number hint, history, instruction) goes strictly at the
+        # tail: provider-side prompt caching only hits on exact prefix
+        # matches, so the system + resume + JD block must stay byte-stable.
         messages = [
-            {"role": "system", "content": self.system_prompt},
-            {"role": "system", "content": f"CANDIDATE RESUME:\n{resume}"},
-            {"role": "system", "content": f"JOB DESCRIPTION:\n{job_description}"},
-            {"role": "system", "content": f"Current Question Number: {question_number + 1}/6"}
+            *self._prompt_prefix(resume, job_description),
+            *history,
+            *new_turns
         ]
-        
-        # Add conversation history
-        for msg in conversation_history:
-            role = "assistant" if msg.sender == "AI" else "user"
-            messages.append({"role": role, "content": msg.text})
-        
-        # Add instruction for next question
+
+        # Single trailing instruction embedding the question-number hint
         if question_number == 0:
-            messages.append({
-                "role": "user", 
-                "content": "Start the interview with a warm greeting and ask the first question about their most recent project."
-            })
+            instruction = "Start the interview with a warm greeting and ask the first question about their most recent project."
         elif question_number == 5:
             # Question 6 - Closing message
-            messages.append({
-                "role": "user",
-                "content": """This is the final message (question 6). Provide a warm closing message that:
+            instruction = """This is the final message (question 6 of 6). Provide a warm closing message that:
 1. Thanks the candidate for their time and detailed responses
 2. Informs them that the screening interview is now complete
 3. Mentions that you have gathered enough information to evaluate their candidacy
@@ -74,22 +133,119 @@ Keep questions conversational and natural. Don't be too formal."""
 5. Wishes them the best and mentions the team will be in touch soon
 
 Keep it professional, warm, and encouraging. This should NOT be a question, but a closing statement."""
-            })
         else:
-            messages.append({
-                "role": "user",
-                "content": f"Ask question {question_number + 1} based on the interview structure and their previous responses."
-            })
-        
-        response = self.client.chat.completions.create(
-            model=settings.azure_openai_deployment,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=300
+            instruction = f"This is question {question_number + 1} of 6. Ask question {question_number + 1} based on the interview structure and their previous responses."
+        messages.append({"role": "user", "content": instruction})
+
+        return messages, history, new_turns
+
+    @staticmethod
+    def _commit_turn(session_id, history, new_turns, reply: str):
+        """Fold a completed turn into the converted-history cache
+
+        Only called once the completion (or the full stream) has arrived, so
+        the next turn appends just the candidate's answer.
+        """
+        if not session_id:
+            return
+        history.extend(new_turns)
+        history.append({"role": "assistant", "content": reply})
+        _history_cache[session_id] = history
+
+    async def get_next_question(
+        self,
+        resume: str,
+        job_description: str,
+        conversation_history: List[ChatMessage],
+        question_number: int,
+        session_id: str = None
+    ) -> str:
+        """Generate next interview question"""
+
+        messages, history, new_turns = self._build_turn(
+            resume, job_description, conversation_history, question_number, session_id
         )
-        
-        return response.choices[0].message.content
+
+        async with self.llm_semaphore:
+            response = await self.client.chat.completions.create(
+                model=settings.azure_openai_deployment,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=300,
+                # Pin cache routing per session so the shared prefix keeps
+                # hitting the same backend across turns
+                prompt_cache_key=session_id or NOT_GIVEN
+            )
+
+        reply = response.choices[0].message.content
+        self._commit_turn(session_id, history, new_turns, reply)
+        return reply
+
+    async def stream_next_question(
+        self,
+        resume: str,
+        job_description: str,
+        conversation_history: List[ChatMessage],
+        question_number: int,
+        session_id: str = None
+    ):
+        """Yield the next question token-by-token as the model generates it
+
+        Perceived latency drops to roughly time-to-first-token instead of
+        the full completion. The caller persists the concatenated reply
+        once the stream closes.
+        """
+        messages, history, new_turns = self._build_turn(
+            resume, job_description, conversation_history, question_number, session_id
+        )
+
+        parts = []
+        async with self.llm_semaphore:
+            stream = await self.client.chat.completions.create(
+                model=settings.azure_openai_deployment,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=300,
+                stream=True,
+                prompt_cache_key=session_id or NOT_GIVEN
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    token = chunk.choices[0].delta.content
+                    parts.append(token)
+                    yield token
+
+        self._commit_turn(session_id, history, new_turns, ''.join(parts))
     
+    def forget_session(self, session_id: str):
+        """Drop per-session prompt state once an interview completes
+
+        The converted-history cache would otherwise hold the transcript
+        until the TTL expires; completed sessions never take another turn.
+        The prefix cache stays - it's keyed by resume/JD digest and shared
+        across sessions.
+        """
+        _history_cache.pop(session_id, None)
+
+    async def _evaluation_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        model: str = None
+    ) -> dict:
+        """Run one evaluation sub-call under the semaphore and parse the JSON"""
+        async with self.llm_semaphore:
+            response = await self.client.chat.completions.create(
+                model=model or settings.azure_openai_deployment,
+                messages=messages,
+                temperature=0.2,
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"}
+            )
+
+        # JSON mode guarantees a bare JSON object - no fence stripping
+        return orjson.loads(response.choices[0].message.content)
+
     async def generate_final_report(
         self,
         candidate_name: str,
@@ -99,29 +255,35 @@ Keep it professional, warm, and encouraging. This should NOT be a question, but
         questions_answered: int
     ) -> FinalReport:
         """Generate comprehensive final evaluation report"""
-        
-        # Format conversation
-        conversation_text = "\n\n".join([
-            f"{msg.sender}: {msg.text}" for msg in conversation_history
-        ])
-        
+
         # Add note if interview was incomplete
         completion_note = ""
         if questions_answered < 6:
             completion_note = f"\n\nNOTE: This interview was completed early with only {questions_answered}/6 questions answered. Adjust your evaluation accordingly and mention this in the detailed feedback."
-        
-        evaluation_prompt = f"""
-Based on the interview, generate a detailed evaluation report.
+
+        # The transcript rides along as native chat turns rather than being
+        # pasted into one huge prompt string: no multi-KB f-string rebuild,
+        # and the evaluator preamble + transcript form a stable prefix shared
+        # by both sub-calls, so the provider's prompt cache covers it. Only
+        # the trailing instruction differs between the two.
+        context_messages = [
+            {"role": "system", "content": f"""You are an expert technical recruiter evaluating candidates. Return only valid JSON.
 
 CANDIDATE RESUME:
 {resume}
 
 JOB DESCRIPTION:
-{job_description}
+{job_description}"""},
+            *[
+                {
+                    "role": "assistant" if msg.sender == "AI" else "user",
+                    "content": msg.text
+                }
+                for msg in conversation_history
+            ]
+        ]
 
-INTERVIEW TRANSCRIPT:
-{conversation_text}
-{completion_note}
+        scores_instruction = f"""Based on the interview above, evaluate the candidate.
 
 Analyze and score the candidate on:
 1. Skill Match (0-100): How well their skills align with job requirements
@@ -130,11 +292,11 @@ Analyze and score the candidate on:
 4. Problem Solving (0-100): Analytical thinking and approach to challenges
 5. Overall Fit (0-100): Composite score considering all factors
 
-Also provide:
-- Recommendation: "Strongly Recommended for Next Round", "Recommended for Next Round", "Maybe - Consider for Next Round", or "Not Recommended"
-- Strengths: List 3-5 key strengths
-- Weaknesses: List 2-4 areas of concern or gaps
-- Detailed Feedback: 2-3 paragraph summary
+Also pick a Recommendation: "Strongly Recommended for Next Round", "Recommended for Next Round", "Maybe - Consider for Next Round", or "Not Recommended"
+
+And list:
+- Strengths: 3-5 key strengths (short phrases)
+- Weaknesses: 2-4 areas of concern or gaps (short phrases)
 
 Return ONLY valid JSON in this exact format:
 {{
@@ -145,32 +307,35 @@ Return ONLY valid JSON in this exact format:
   "overall_fit": 84,
   "recommendation": "Recommended for Next Round",
   "strengths": ["Strong React expertise", "Good problem-solving", "Clear communication"],
-  "weaknesses": ["Limited cloud experience", "Needs more system design practice"],
+  "weaknesses": ["Limited cloud experience", "Needs more system design practice"]
+}}{completion_note}
+"""
+
+        narrative_instruction = f"""Based on the interview above, provide a Detailed Feedback: 2-3 paragraph summary of the candidate's performance.
+
+Return ONLY valid JSON in this exact format:
+{{
   "detailed_feedback": "The candidate demonstrated..."
-}}
+}}{completion_note}
 """
-        
-        response = self.client.chat.completions.create(
-            model=settings.azure_openai_deployment,
-            messages=[
-                {"role": "system", "content": "You are an expert technical recruiter evaluating candidates. Return only valid JSON."},
-                {"role": "user", "content": evaluation_prompt}
-            ],
-            temperature=0.2,
-            max_tokens=1500
+
+        # Scores and narrative are independent; running them concurrently
+        # makes report latency the max of the two instead of their sum. The
+        # scores + short lists need few output tokens and tolerate a cheaper
+        # model; only the narrative gets the main deployment and a real budget.
+        scores, narrative = await asyncio.gather(
+            self._evaluation_call(
+                [*context_messages, {"role": "user", "content": scores_instruction}],
+                max_tokens=300,
+                model=settings.azure_openai_scoring_deployment or None
+            ),
+            self._evaluation_call(
+                [*context_messages, {"role": "user", "content": narrative_instruction}],
+                max_tokens=400
+            )
         )
-        
-        result_text = response.choices[0].message.content.strip()
-        
-        # Clean markdown formatting
-        if result_text.startswith('```'):
-            result_text = result_text.split('```')[1]
-            if result_text.startswith('json'):
-                result_text = result_text[4:]
-            result_text = result_text.rsplit('```', 1)[0]
-        
-        evaluation = json.loads(result_text)
-        
+        evaluation = {**scores, **narrative}
+
         # Create FinalReport object
         report = FinalReport(
             session_id="",
@@ -185,7 +350,7 @@ Return ONLY valid JSON in this exact format:
             weaknesses=evaluation['weaknesses'],
             detailed_feedback=evaluation['detailed_feedback'],
             transcript=conversation_history,
-            generated_at=datetime.utcnow()
+            generated_at=_utcnow()
         )
         
         return report
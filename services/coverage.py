@@ -0,0 +1,77 @@
+import logging
+from config import get_settings
+from services.openai_client import openai_client
+from cachetools import TTLCache
+from typing import List
+import numpy as np
+import re
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# An answer "covers" a JD competency once cosine similarity crosses this
+COVERAGE_THRESHOLD = 0.55
+# Fraction of competencies that must be covered before closing early
+COVERAGE_REQUIRED = 0.8
+
+class CoverageEvaluator:
+    """Tracks how much of the job description a candidate's answers have covered
+
+    Used by /api/chat to short-circuit to the closing message once the answers
+    converge, saving the remaining LLM round-trips in a session.
+    """
+
+    def __init__(self):
+        self.client = openai_client
+        # session_id -> {"competency_vecs": ndarray, "covered": set of indexes}
+        self._sessions: TTLCache = TTLCache(maxsize=10_000, ttl=1800)
+
+    def _extract_competencies(self, job_description: str) -> List[str]:
+        """Split the JD into competency statements (lines, bullets, sentences)"""
+        parts = re.split(r'[\n•;]+|\.\s', job_description)
+        competencies = [p.strip() for p in parts if len(p.strip()) > 20]
+        return competencies[:16]
+
+    async def _embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts and pre-normalize so similarity is a plain dot product"""
+        response = await self.client.embeddings.create(
+            model=settings.azure_openai_embedding_deployment,
+            input=texts
+        )
+        vectors = np.array([d.embedding for d in response.data], dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+    async def answers_converged(
+        self,
+        session_id: str,
+        job_description: str,
+        answer: str
+    ) -> bool:
+        """Fold the latest answer into coverage; True when enough of the JD is covered"""
+        try:
+            state = self._sessions.get(session_id)
+            if state is None:
+                competencies = self._extract_competencies(job_description)
+                if not competencies:
+                    return False
+                state = {
+                    "competency_vecs": await self._embed(competencies),
+                    "covered": set()
+                }
+                self._sessions[session_id] = state
+
+            answer_vec = (await self._embed([answer]))[0]
+            similarities = state["competency_vecs"] @ answer_vec
+            state["covered"].update(
+                np.flatnonzero(similarities >= COVERAGE_THRESHOLD).tolist()
+            )
+
+            required = int(len(state["competency_vecs"]) * COVERAGE_REQUIRED)
+            return len(state["covered"]) >= max(required, 1)
+        except Exception as e:
+            # Coverage is an optimization - never fail the chat turn over it
+            logger.warning("Coverage check error: %s", e)
+            return False
+
+coverage_evaluator = CoverageEvaluator()
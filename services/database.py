@@ -1,53 +1,77 @@
-from azure.cosmos import CosmosClient, PartitionKey, exceptions
+import base64
+import logging
+import threading
+from azure.cosmos import PartitionKey, exceptions
+from azure.cosmos.aio import CosmosClient
 from config import get_settings
-from models import InterviewSession, ChatMessage, FinalReport
-from typing import Optional, List, Dict, Any
+from models import InterviewSession, ChatMessage, FinalReport, MESSAGE_LIST_ADAPTER, _utcnow
+from typing import Optional, List, Dict, Any, Tuple
+import orjson
 import uuid
-from datetime import datetime
+import zstandard
 
 settings = get_settings()
-
-def serialize_datetime(obj: Dict[str, Any]) -> Dict[str, Any]:
-    """Recursively serialize datetime objects to ISO format strings for Cosmos DB"""
-    if isinstance(obj, dict):
-        return {k: serialize_datetime(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [serialize_datetime(item) for item in obj]
-    elif isinstance(obj, datetime):
-        return obj.isoformat()
-    return obj
+logger = logging.getLogger(__name__)
 
 class DatabaseService:
+    """Async Cosmos DB access - all operations await instead of blocking the event loop"""
+
     def __init__(self):
         self.client = CosmosClient(
             url=settings.cosmos_uri,
             credential=settings.cosmos_key
         )
         self.database = self.client.get_database_client(settings.cosmos_database)
-        
-        # Initialize containers
-        self._init_containers()
-    
-    def _init_containers(self):
-        """Initialize Cosmos DB containers"""
+
+    async def initialize(self):
+        """Initialize Cosmos DB containers - call once from the startup event"""
         try:
             # Sessions container
-            self.sessions_container = self.database.create_container_if_not_exists(
+            self.sessions_container = await self.database.create_container_if_not_exists(
                 id="sessions",
                 partition_key=PartitionKey(path="/session_id"),
                 offer_throughput=400
             )
-            
+
             # Reports container
-            self.reports_container = self.database.create_container_if_not_exists(
+            self.reports_container = await self.database.create_container_if_not_exists(
                 id="reports",
                 partition_key=PartitionKey(path="/session_id"),
                 offer_throughput=400
             )
+
+            # MCQ containers, created here once instead of lazily per call
+            self.mcq_sessions_container = await self.database.create_container_if_not_exists(
+                id="mcq_sessions",
+                partition_key=PartitionKey(path="/session_id"),
+                offer_throughput=400
+            )
+            self.mcq_reports_container = await self.database.create_container_if_not_exists(
+                id="mcq_reports",
+                partition_key=PartitionKey(path="/session_id"),
+                offer_throughput=400
+            )
         except exceptions.CosmosHttpResponseError as e:
-            print(f"Container initialization error: {e}")
-    
-    def create_session(
+            logger.error("Container initialization error: %s", e)
+
+    async def close(self):
+        """Close the underlying aiohttp connections - call from the shutdown event"""
+        await self.client.close()
+
+    async def ping(self):
+        """Warm the Cosmos connection with a cheap point read (TLS + auth setup)"""
+        try:
+            await self.sessions_container.read_item(
+                item="_warmup",
+                partition_key="_warmup"
+            )
+        except exceptions.CosmosResourceNotFoundError:
+            # Expected - the sentinel doc doesn't exist, the handshake is what we wanted
+            pass
+        except Exception as e:
+            logger.warning("Cosmos warmup error: %s", e)
+
+    async def create_session(
         self,
         candidate_name: str,
         candidate_email: str,
@@ -56,7 +80,7 @@ class DatabaseService:
     ) -> str:
         """Create new interview session"""
         session_id = str(uuid.uuid4())
-        
+
         session = InterviewSession(
             id=session_id,
             session_id=session_id,
@@ -68,91 +92,146 @@ class DatabaseService:
             question_count=0,
             is_complete=False
         )
-        
+
         # Convert to dict with proper datetime serialization
         session_dict = session.model_dump(mode='json')  # Changed this line
-        
-        self.sessions_container.create_item(body=session_dict)
+
+        await self.sessions_container.create_item(body=session_dict)
         return session_id
-    
-    def get_session(self, session_id: str) -> Optional[InterviewSession]:
+
+    async def get_session(self, session_id: str) -> Optional[InterviewSession]:
         """Retrieve session by ID"""
         try:
-            item = self.sessions_container.read_item(
+            item = await self.sessions_container.read_item(
                 item=session_id,
                 partition_key=session_id
             )
-            return InterviewSession(**item)
+            session = InterviewSession(**item)
+            if session.messages_compressed and not session.messages:
+                session.messages = self._decompress_messages(session.messages_compressed)
+                # Drop the blob once inflated so API responses don't carry
+                # the transcript twice (decompressed + base64 zstd)
+                session.messages_compressed = None
+            return session
         except exceptions.CosmosResourceNotFoundError:
             return None
-    
-    def update_session(
+
+    def _decompress_messages(self, blob: str) -> List[ChatMessage]:
+        """Inflate an archived transcript back into ChatMessage objects"""
+        raw = zstandard.ZstdDecompressor().decompress(base64.b64decode(blob))
+        return MESSAGE_LIST_ADAPTER.validate_python(orjson.loads(raw))
+
+    async def archive_session_messages(self, session: InterviewSession):
+        """Compress a completed transcript into a single zstd blob
+
+        Long candidate answers dominate session document size; once the
+        interview is complete nobody appends again, so the messages array is
+        folded into one base64 zstd field. get_session inflates it on read.
+        """
+        if not session.messages:
+            return
+        blob = zstandard.ZstdCompressor(level=10).compress(
+            orjson.dumps([m.model_dump(mode='json') for m in session.messages])
+        )
+        session.messages_compressed = base64.b64encode(blob).decode('ascii')
+        session.messages = []
+        await self.upsert_session(session)
+
+    async def upsert_session(self, session: InterviewSession):
+        """Persist an already-validated session without a read-modify-write
+
+        No extra point read and no second Pydantic pass: callers hold the
+        authoritative in-memory session (the write-behind flusher), so this
+        is one model_dump(mode='json') and one upsert.
+        """
+        session.updated_at = _utcnow()
+        await self.sessions_container.upsert_item(body=session.model_dump(mode='json'))
+
+    async def append_messages(
         self,
         session_id: str,
-        messages: List[ChatMessage],
+        new_messages: List[ChatMessage],
         question_count: int,
         is_complete: bool = False
     ):
-        """Update session with new messages"""
-        try:
-            session = self.get_session(session_id)
-            if not session:
-                raise ValueError(f"Session {session_id} not found")
-            
-            session.messages = messages
-            session.question_count = question_count
-            session.is_complete = is_complete
-            
-            from datetime import datetime
-            session.updated_at = datetime.utcnow()
-            
-            # Convert to dict with proper datetime serialization
-            session_dict = session.model_dump(mode='json')  # Changed this line
-            
-            self.sessions_container.upsert_item(body=session_dict)
-        except Exception as e:
-            print(f"Session update error: {e}")
-            raise
-    
-    def save_report(self, report: FinalReport):
+        """Append only the new messages via Cosmos partial-document PATCH
+
+        Cosmos's equivalent of a Mongo $push + $set: the write carries just
+        the delta for the turn, not the accumulated transcript.
+        """
+        operations = [
+            {"op": "add", "path": "/messages/-", "value": msg.model_dump(mode='json')}
+            for msg in new_messages
+        ]
+        operations.append({"op": "set", "path": "/question_count", "value": question_count})
+        operations.append({"op": "set", "path": "/is_complete", "value": is_complete})
+        operations.append({"op": "set", "path": "/updated_at", "value": _utcnow().isoformat()})
+
+        await self.sessions_container.patch_item(
+            item=session_id,
+            partition_key=session_id,
+            patch_operations=operations
+        )
+
+    async def save_report(self, report: FinalReport):
         """Save final evaluation report"""
         try:
             # Convert to dict with proper datetime serialization
             report_dict = report.model_dump(mode='json')  # Changed this line
             report_dict['id'] = report.session_id
-            
-            self.reports_container.upsert_item(body=report_dict)
+
+            await self.reports_container.upsert_item(body=report_dict)
         except Exception as e:
-            print(f"Report save error: {e}")
+            logger.error("Report save error: %s", e)
             raise
-    
-    def get_report(self, session_id: str) -> Optional[FinalReport]:
+
+    async def get_report(self, session_id: str) -> Optional[FinalReport]:
         """Retrieve report by session ID"""
         try:
-            item = self.reports_container.read_item(
+            item = await self.reports_container.read_item(
                 item=session_id,
                 partition_key=session_id
             )
             return FinalReport(**item)
         except exceptions.CosmosResourceNotFoundError:
             return None
-    
-    def list_all_reports(self, limit: int = 50) -> List[FinalReport]:
-        """List all reports"""
+
+    async def list_all_reports(
+        self,
+        limit: int = 50,
+        continuation: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """List one page of report summaries for the dashboard
+
+        Projects only the summary fields instead of SELECT * - the long
+        feedback text and full transcript stay in Cosmos, cutting RUs and
+        bytes over the wire by an order of magnitude. Pages via Cosmos
+        continuation tokens rather than OFFSET, so deep pages don't re-scan
+        and re-discard everything before them; returns (items, token), with
+        token None on the last page.
+        """
         try:
-            query = f"SELECT * FROM c ORDER BY c.generated_at DESC OFFSET 0 LIMIT {limit}"
-            items = list(self.reports_container.query_items(
+            query = (
+                "SELECT c.session_id, c.candidate_name, c.overall_fit, "
+                "c.recommendation, c.generated_at "
+                "FROM c ORDER BY c.generated_at DESC"
+            )
+            pager = self.reports_container.query_items(
                 query=query,
-                enable_cross_partition_query=True
-            ))
-            return [FinalReport(**item) for item in items]
+                max_item_count=limit
+            ).by_page(continuation)
+            items = []
+            async for page in pager:
+                items = [item async for item in page]
+                break
+            return items, pager.continuation_token
         except Exception as e:
-            print(f"List reports error: {e}")
-            return []
-        
+            logger.error("List reports error: %s", e)
+            return [], None
+
     # Add these methods to the DatabaseService class
 
-    def create_mcq_session(
+    async def create_mcq_session(
         self,
         candidate_name: str,
         candidate_email: str,
@@ -162,8 +241,16 @@ class DatabaseService:
     ) -> str:
         """Create new MCQ session"""
         session_id = str(uuid.uuid4())
-        
-        from models import MCQSession
+
+        from models import MCQSession, MCQ_PRIVATE_QUESTION_FIELDS
+
+        # Strip the answer key once at creation so serving a question later
+        # is a plain list index instead of a per-request rebuild
+        public_questions = [
+            {k: v for k, v in q.items() if k not in MCQ_PRIVATE_QUESTION_FIELDS}
+            for q in questions
+        ]
+
         session = MCQSession(
             id=session_id,
             session_id=session_id,
@@ -172,36 +259,22 @@ class DatabaseService:
             resume_text=resume_text,
             job_description=job_description,
             questions=questions,
+            public_questions=public_questions,
             answers=[],
             current_question_number=0,
             is_complete=False
         )
-        
-        # Convert to dict and serialize datetime objects
-        session_dict = session.model_dump()
-        session_dict = serialize_datetime(session_dict)
-        
-        # Create MCQ sessions container if not exists
-        try:
-            self.mcq_sessions_container = self.database.create_container_if_not_exists(
-                id="mcq_sessions",
-                partition_key=PartitionKey(path="/session_id"),
-                offer_throughput=400
-            )
-        except:
-            pass
-        
-        self.mcq_sessions_container.create_item(body=session_dict)
+
+        session_dict = session.model_dump(mode='json')
+
+        await self.mcq_sessions_container.create_item(body=session_dict)
         return session_id
 
-    def get_mcq_session(self, session_id: str):
+    async def get_mcq_session(self, session_id: str):
         """Retrieve MCQ session by ID"""
         try:
             from models import MCQSession
-            if not hasattr(self, 'mcq_sessions_container'):
-                self.mcq_sessions_container = self.database.get_container_client("mcq_sessions")
-            
-            item = self.mcq_sessions_container.read_item(
+            item = await self.mcq_sessions_container.read_item(
                 item=session_id,
                 partition_key=session_id
             )
@@ -209,61 +282,91 @@ class DatabaseService:
         except exceptions.CosmosResourceNotFoundError:
             return None
 
-    def update_mcq_session(
+    async def get_mcq_session_public(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Retrieve an MCQ session with the answer key projected away in-query
+
+        While the test is still running, correct_option and explanation are
+        stripped from each question inside the Cosmos projection, so the
+        sensitive fields never cross the wire and no Python pop loop is
+        needed. Completed sessions come back in full.
+        """
+        try:
+            query = (
+                "SELECT c.id, c.session_id, c.candidate_name, c.candidate_email, "
+                "c.resume_text, c.job_description, c.public_questions, "
+                "c.current_question_number, c.is_complete, c.answers, "
+                "c.created_at, c.updated_at, "
+                "(c.is_complete ? c.questions : ARRAY("
+                "SELECT q.question_number, q.question_text, q.options, q.category "
+                "FROM q IN c.questions)) AS questions "
+                "FROM c WHERE c.session_id = @session_id"
+            )
+            items = [
+                item async for item in self.mcq_sessions_container.query_items(
+                    query=query,
+                    parameters=[{"name": "@session_id", "value": session_id}],
+                    partition_key=session_id
+                )
+            ]
+            return items[0] if items else None
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+
+    async def append_mcq_answer(
         self,
         session_id: str,
-        answers: List,
+        answer,
         current_question_number: int,
         is_complete: bool = False
     ):
-        """Update MCQ session with new answer"""
+        """Append a single answer via Cosmos partial-document PATCH
+
+        Same shape as append_messages: the write carries the new answer and
+        the changed scalar fields, not the whole session document with its
+        resume text and question bank.
+        """
+        operations = [
+            {"op": "add", "path": "/answers/-", "value": answer.model_dump(mode='json')},
+            {"op": "set", "path": "/current_question_number", "value": current_question_number},
+            {"op": "set", "path": "/is_complete", "value": is_complete},
+            {"op": "set", "path": "/updated_at", "value": _utcnow().isoformat()}
+        ]
+
+        await self.mcq_sessions_container.patch_item(
+            item=session_id,
+            partition_key=session_id,
+            patch_operations=operations
+        )
+
+    async def upsert_mcq_session(self, session):
+        """Persist an already-validated MCQ session without a read-modify-write
+
+        Counterpart of upsert_session: no extra point read, one
+        model_dump(mode='json') pass, one upsert.
+        """
         try:
-            session = self.get_mcq_session(session_id)
-            if not session:
-                raise ValueError(f"MCQ Session {session_id} not found")
-            
-            session.answers = answers
-            session.current_question_number = current_question_number
-            session.is_complete = is_complete
-            session.updated_at = datetime.utcnow()
-            
-            # Convert to dict and serialize datetime objects
-            session_dict = session.model_dump()
-            session_dict = serialize_datetime(session_dict)
-            
-            self.mcq_sessions_container.upsert_item(body=session_dict)
+            session.updated_at = _utcnow()
+            await self.mcq_sessions_container.upsert_item(body=session.model_dump(mode='json'))
         except Exception as e:
-            print(f"MCQ session update error: {e}")
+            logger.error("MCQ session update error: %s", e)
             raise
 
-    def save_mcq_report(self, report):
+    async def save_mcq_report(self, report):
         """Save MCQ evaluation report"""
         try:
-            if not hasattr(self, 'mcq_reports_container'):
-                self.mcq_reports_container = self.database.create_container_if_not_exists(
-                    id="mcq_reports",
-                    partition_key=PartitionKey(path="/session_id"),
-                    offer_throughput=400
-                )
-            
-            # Convert to dict and serialize datetime objects
-            report_dict = report.model_dump()
-            report_dict = serialize_datetime(report_dict)
+            report_dict = report.model_dump(mode='json')
             report_dict['id'] = report.session_id
-            
-            self.mcq_reports_container.upsert_item(body=report_dict)
+
+            await self.mcq_reports_container.upsert_item(body=report_dict)
         except Exception as e:
-            print(f"MCQ report save error: {e}")
+            logger.error("MCQ report save error: %s", e)
             raise
 
-    def get_mcq_report(self, session_id: str):
+    async def get_mcq_report(self, session_id: str):
         """Retrieve MCQ report by session ID"""
         try:
             from models import MCQEvaluationReport
-            if not hasattr(self, 'mcq_reports_container'):
-                self.mcq_reports_container = self.database.get_container_client("mcq_reports")
-            
-            item = self.mcq_reports_container.read_item(
+            item = await self.mcq_reports_container.read_item(
                 item=session_id,
                 partition_key=session_id
             )
@@ -271,4 +374,23 @@ class DatabaseService:
         except exceptions.CosmosResourceNotFoundError:
             return None
 
-database_service = DatabaseService()
\ No newline at end of file
+# Lazy singleton: constructing the service builds the Cosmos client, so defer
+# it until first use instead of paying for it (or failing) at import time.
+# The container handshake itself stays in initialize(), called from startup.
+_instance: Optional[DatabaseService] = None
+_instance_lock = threading.Lock()
+
+def get_database_service() -> DatabaseService:
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = DatabaseService()
+    return _instance
+
+def __getattr__(name):
+    # Keep `from services.database import database_service` working without
+    # re-introducing the import-time construction
+    if name == "database_service":
+        return get_database_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
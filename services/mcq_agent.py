@@ -1,19 +1,21 @@
-from openai import AzureOpenAI
+import logging
 from config import get_settings
+from services.ai_agent import AIAgentService
+from services.openai_client import openai_client
 from models import MCQQuestion, MCQOption, MCQAnswer, MCQEvaluationReport
+from services.mcq_cache import mcq_question_cache
 from typing import List, Dict, Any
-import json
-from datetime import datetime
+from collections import Counter
+import orjson
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 class MCQAgentService:
     def __init__(self):
-        self.client = AzureOpenAI(
-            azure_endpoint=settings.azure_openai_endpoint,
-            api_key=settings.azure_openai_api_key,
-            api_version=settings.azure_openai_api_version
-        )
+        self.client = openai_client
+        # Share the interview agent's cap on in-flight completions
+        self.llm_semaphore = AIAgentService.llm_semaphore
     
     async def generate_mcq_questions(
         self,
@@ -22,7 +24,13 @@ class MCQAgentService:
         count: int = 5
     ) -> List[Dict[str, Any]]:
         """Generate MCQ questions based on resume and JD"""
-        
+
+        # Many candidates share a JD; reuse a stored question set when the
+        # JD + skill fingerprint matches exactly or semantically
+        cached, cache_key, embedding = await mcq_question_cache.lookup(resume, job_description)
+        if cached is not None:
+            return cached
+
         prompt = f"""
 You are an expert technical recruiter creating cognitive aptitude assessment questions.
 
@@ -65,53 +73,46 @@ Return ONLY valid JSON in this exact format:
 """
         
         try:
-            response = self.client.chat.completions.create(
-                model=settings.azure_openai_deployment,
-                messages=[
-                    {"role": "system", "content": "You are an expert at creating cognitive aptitude assessments. Return only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=3000
-            )
-            
-            result_text = response.choices[0].message.content.strip()
-            
-            # Clean markdown formatting
-            if result_text.startswith('```'):
-                result_text = result_text.split('```')[1]
-                if result_text.startswith('json'):
-                    result_text = result_text[4:]
-                result_text = result_text.rsplit('```', 1)[0]
-            
-            parsed = json.loads(result_text)
-            return parsed['questions']
-            
+            async with self.llm_semaphore:
+                response = await self.client.chat.completions.create(
+                    model=settings.azure_openai_deployment,
+                    messages=[
+                        {"role": "system", "content": "You are an expert at creating cognitive aptitude assessments. Return only valid JSON."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=3000,
+                    response_format={"type": "json_object"}
+                )
+
+            # JSON mode guarantees a bare JSON object - no fence stripping
+            parsed = orjson.loads(response.choices[0].message.content)
+            questions = parsed['questions']
+            mcq_question_cache.store(cache_key, embedding, questions)
+            return questions
+
         except Exception as e:
-            print(f"MCQ generation error: {e}")
+            logger.error("MCQ generation error: %s", e)
             raise Exception(f"Failed to generate MCQ questions: {str(e)}")
     
-    async def evaluate_answer(
+    def evaluate_answer(
         self,
         question_data: Dict[str, Any],
         selected_option: str
     ) -> MCQAnswer:
-        """Evaluate a single MCQ answer"""
-        
+        """Evaluate a single MCQ answer - pure local computation, no API call"""
+
         correct_option = question_data['correct_option']
-        is_correct = selected_option.upper() == correct_option.upper()
-        
-        # Find selected option text
-        selected_text = ""
-        for opt in question_data['options']:
-            if opt['option'].upper() == selected_option.upper():
-                selected_text = opt['text']
-                break
-        
+        selected_option = selected_option.upper()
+        is_correct = selected_option == correct_option.upper()
+
+        option_texts = {opt['option'].upper(): opt['text'] for opt in question_data['options']}
+        selected_text = option_texts.get(selected_option, "")
+
         return MCQAnswer(
             question_number=question_data['question_number'],
             question_text=question_data['question_text'],
-            selected_option=selected_option.upper(),
+            selected_option=selected_option,
             selected_text=selected_text,
             correct_option=correct_option.upper(),
             is_correct=is_correct,
@@ -123,28 +124,31 @@ Return ONLY valid JSON in this exact format:
         candidate_name: str,
         resume: str,
         job_description: str,
-        answers: List[MCQAnswer]
+        answers: List[MCQAnswer],
+        questions: List[Dict[str, Any]]
     ) -> MCQEvaluationReport:
         """Generate comprehensive MCQ evaluation report"""
-        
+
         # Calculate scores
         total_questions = len(answers)
         correct_answers = sum(1 for ans in answers if ans.is_correct)
         score_percentage = (correct_answers / total_questions * 100) if total_questions > 0 else 0
-        
-        # Calculate category-wise scores
-        category_scores = {}
-        for answer in answers:
-            # Extract category from stored question data (you'll need to pass this)
-            category = "General"  # Default category
-            
-            if category not in category_scores:
-                category_scores[category] = {"correct": 0, "total": 0}
-            
-            category_scores[category]["total"] += 1
-            if answer.is_correct:
-                category_scores[category]["correct"] += 1
-        
+
+        # Category-wise scores in one Counter pass, using the real categories
+        # from the question bank (previously hardcoded to "General")
+        totals = Counter(
+            questions[ans.question_number - 1].get('category', 'General')
+            for ans in answers
+        )
+        corrects = Counter(
+            questions[ans.question_number - 1].get('category', 'General')
+            for ans in answers if ans.is_correct
+        )
+        category_scores = {
+            category: {"correct": corrects.get(category, 0), "total": total}
+            for category, total in totals.items()
+        }
+
         # Format answers for AI analysis
         answers_summary = "\n\n".join([
             f"Q{ans.question_number}: {ans.question_text}\n"
@@ -188,26 +192,19 @@ Return ONLY valid JSON:
 """
         
         try:
-            response = self.client.chat.completions.create(
-                model=settings.azure_openai_deployment,
-                messages=[
-                    {"role": "system", "content": "You are an expert at evaluating cognitive aptitude assessments. Return only valid JSON."},
-                    {"role": "user", "content": assessment_prompt}
-                ],
-                temperature=0.3,
-                max_tokens=1000
-            )
-            
-            result_text = response.choices[0].message.content.strip()
-            
-            # Clean markdown formatting
-            if result_text.startswith('```'):
-                result_text = result_text.split('```')[1]
-                if result_text.startswith('json'):
-                    result_text = result_text[4:]
-                result_text = result_text.rsplit('```', 1)[0]
-            
-            assessment = json.loads(result_text)
+            async with self.llm_semaphore:
+                response = await self.client.chat.completions.create(
+                    model=settings.azure_openai_deployment,
+                    messages=[
+                        {"role": "system", "content": "You are an expert at evaluating cognitive aptitude assessments. Return only valid JSON."},
+                        {"role": "user", "content": assessment_prompt}
+                    ],
+                    temperature=0.3,
+                    max_tokens=1000,
+                    response_format={"type": "json_object"}
+                )
+
+            assessment = orjson.loads(response.choices[0].message.content)
             
             return MCQEvaluationReport(
                 session_id="",  # Will be set by caller
@@ -224,7 +221,7 @@ Return ONLY valid JSON:
             )
             
         except Exception as e:
-            print(f"Evaluation report error: {e}")
+            logger.error("Evaluation report error: %s", e)
             raise Exception(f"Failed to generate evaluation report: {str(e)}")
 
 mcq_agent_service = MCQAgentService()
\ No newline at end of file
@@ -0,0 +1,109 @@
+import logging
+from config import get_settings
+from services.openai_client import openai_client
+from cachetools import TTLCache
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import numpy as np
+import re
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Cosine similarity above which a stored question set is reused outright
+SEMANTIC_HIT_THRESHOLD = 0.93
+# Question sets stay reusable for a week - JDs rarely change faster
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# Capitalized tech-ish tokens (React, PostgreSQL, C#, Node.js, ...)
+_SKILL_TOKEN_RE = re.compile(r'\b[A-Z][A-Za-z0-9+#.]+\b')
+_WS_RE = re.compile(r'\s+')
+
+class MCQQuestionCache:
+    """Two-stage cache for generated MCQ question sets
+
+    Many candidates apply against the same JD with similar skill sets, and
+    each MCQ generation is a ~3k-token completion. Stage one is an exact
+    lookup keyed on the normalized JD plus a fingerprint of the resume's
+    skill tokens; stage two embeds the pair and reuses the closest stored
+    set when cosine similarity clears SEMANTIC_HIT_THRESHOLD. A miss costs
+    one embedding call, a hit saves the full generation.
+    """
+
+    def __init__(self):
+        self.client = openai_client
+        # exact key -> {"embedding": ndarray | None, "questions": [...]}
+        self._entries: TTLCache = TTLCache(maxsize=2048, ttl=CACHE_TTL_SECONDS)
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return _WS_RE.sub(' ', text.strip().lower())
+
+    @staticmethod
+    def _skills_fingerprint(resume: str) -> str:
+        """Top-20 distinct skill-looking tokens, in order of appearance"""
+        tokens = []
+        seen = set()
+        for match in _SKILL_TOKEN_RE.finditer(resume):
+            token = match.group(0).lower()
+            if token not in seen:
+                seen.add(token)
+                tokens.append(token)
+                if len(tokens) >= 20:
+                    break
+        return ' '.join(tokens)
+
+    async def _embed(self, text: str) -> Optional[np.ndarray]:
+        """Embed and pre-normalize; None on failure (the cache just misses)"""
+        try:
+            response = await self.client.embeddings.create(
+                model=settings.azure_openai_embedding_deployment,
+                input=[text]
+            )
+            vector = np.array(response.data[0].embedding, dtype=np.float32)
+            return vector / np.linalg.norm(vector)
+        except Exception as e:
+            logger.warning("MCQ cache embedding error: %s", e)
+            return None
+
+    async def lookup(
+        self,
+        resume: str,
+        job_description: str
+    ) -> Tuple[Optional[List[Dict[str, Any]]], str, Optional[np.ndarray]]:
+        """Return (questions or None, exact key, embedding) for this pair
+
+        The key and embedding are handed back so a subsequent store() after
+        a generation doesn't repeat the hashing or the embedding call.
+        """
+        fingerprint = self._skills_fingerprint(resume)
+        key = hashlib.sha256(
+            (self._normalize(job_description) + '|' + fingerprint).encode()
+        ).hexdigest()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry["questions"], key, entry["embedding"]
+
+        embedding = await self._embed(self._normalize(job_description) + '\n' + fingerprint)
+        if embedding is not None and self._entries:
+            candidates = [e for e in self._entries.values() if e["embedding"] is not None]
+            if candidates:
+                # One vectorized dot product over all stored embeddings
+                vectors = np.stack([e["embedding"] for e in candidates])
+                similarities = vectors @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= SEMANTIC_HIT_THRESHOLD:
+                    return candidates[best]["questions"], key, embedding
+
+        return None, key, embedding
+
+    def store(
+        self,
+        key: str,
+        embedding: Optional[np.ndarray],
+        questions: List[Dict[str, Any]]
+    ):
+        self._entries[key] = {"embedding": embedding, "questions": questions}
+
+mcq_question_cache = MCQQuestionCache()
@@ -0,0 +1,32 @@
+import httpx
+from openai import AsyncAzureOpenAI
+from config import get_settings
+
+settings = get_settings()
+
+# One pooled HTTP/2 client shared by every service that talks to Azure
+# OpenAI: keep-alive avoids a TLS handshake per request, HTTP/2 multiplexes
+# concurrent calls over a single connection, and transport retries cover
+# dropped keep-alives. Separate per-service clients each carried their own
+# default-sized pool and redid handshakes under load.
+http_client = httpx.AsyncClient(
+    transport=httpx.AsyncHTTPTransport(
+        retries=2,
+        http2=True,
+        limits=httpx.Limits(
+            max_keepalive_connections=100,
+            max_connections=200
+        )
+    ),
+    timeout=httpx.Timeout(60.0, connect=5.0)
+)
+
+openai_client = AsyncAzureOpenAI(
+    azure_endpoint=settings.azure_openai_endpoint,
+    api_key=settings.azure_openai_api_key,
+    api_version=settings.azure_openai_api_version,
+    http_client=http_client,
+    # SDK-level exponential backoff on 429/5xx/timeouts, on top of the
+    # transport retries above (which only cover connection drops)
+    max_retries=3
+)
@@ -1,13 +1,108 @@
-from azure.ai.formrecognizer import DocumentAnalysisClient
+import logging
+from azure.ai.formrecognizer.aio import DocumentAnalysisClient
 from azure.core.credentials import AzureKeyCredential
-from models import ParsedResume, ParsedExperience
+from cachetools import TTLCache
+from models import ParsedResume, EXPERIENCE_LIST_ADAPTER
 from config import get_settings
+from services.ai_agent import AIAgentService
+from services.openai_client import openai_client
 import PyPDF2
-import docx
+import pypdfium2 as pdfium
+import tiktoken
+import anyio.to_thread
+import asyncio
+import hashlib
 import io
-from typing import List
+import orjson
+import os
+import re
+import threading
+import zipfile
+from lxml import etree
+import numpy as np
+from typing import List, Optional
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Memoize parse results by content digest so re-uploads of the same file
+# (retries, re-submissions) skip the Document Intelligence + GPT round-trips.
+# blake2b is fast and collision resistance isn't a concern here.
+_parse_cache: TTLCache = TTLCache(maxsize=1024, ttl=86400)
+
+# Second tier over _parse_with_ai, keyed on the extracted text rather than
+# the file bytes: the same resume re-exported or lightly edited hashes to a
+# different file but reads nearly the same. Threshold is high - small resume
+# differences (a new role, changed dates) are exactly what matters.
+_TEXT_SEMANTIC_THRESHOLD = 0.95
+# text digest -> {"embedding": ndarray | None, "parsed": dict}
+_text_parse_cache: TTLCache = TTLCache(maxsize=2048, ttl=86400)
+
+# Precompiled once - these run against every resume on the rule-first path
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+PHONE_RE = re.compile(r"\+?\d[\d\s().-]{7,}\d")
+
+# Extracted DOCX text by content digest: the fallback branches can hit the
+# same document twice in one request (local fast path, then DI-failure
+# fallback), and the zlib inflate + XML parse dominate DOCX cost
+_docx_text_cache: TTLCache = TTLCache(maxsize=256, ttl=3600)
+
+# Lenient parser so pathological documents degrade instead of raising
+_DOCX_XML_PARSER = etree.XMLParser(huge_tree=True, recover=True)
+
+# PDFium is not thread-safe and pypdfium2 adds no locking of its own, so all
+# PDFium calls are serialized even though extraction runs on worker threads.
+# Serialized PDFium still beats PyPDF2 by an order of magnitude.
+_pdfium_lock = threading.Lock()
+
+# Token budget for the resume text sent to the parse call; a 30-page
+# document or a garbled PDF extraction would otherwise blow the context
+# window and fail the request at full cost
+_MAX_PARSE_INPUT_TOKENS = 6000
+
+_token_encoder = None
+
+def _get_token_encoder():
+    """cl100k_base encoder, built on first use (construction loads the BPE table)"""
+    global _token_encoder
+    if _token_encoder is None:
+        _token_encoder = tiktoken.get_encoding("cl100k_base")
+    return _token_encoder
+
+def _truncate_to_token_budget(text: str) -> str:
+    """Clamp text to the parse-call token budget; contact details and recent
+    experience sit at the top of a resume, so truncating the tail is safe"""
+    encoder = _get_token_encoder()
+    tokens = encoder.encode(text)
+    if len(tokens) <= _MAX_PARSE_INPUT_TOKENS:
+        return text
+    return encoder.decode(tokens[:_MAX_PARSE_INPUT_TOKENS])
+
+# Static head of the parse prompt. Kept as one module-level constant so every
+# call sends an identical prefix with only the resume text varying at the tail.
+_PARSE_PROMPT_PREAMBLE = """Extract the following information from the resume text at the end and return ONLY valid JSON:
+
+{
+  "name": "full name",
+  "email": "email address",
+  "phone": "phone number",
+  "skills": ["skill1", "skill2", ...],
+  "education": ["degree/institution", ...],
+  "experience": [
+    {
+      "company": "company name",
+      "role": "job title",
+      "dates": "employment period",
+      "description": "brief description"
+    }
+  ]
+}
+
+Return ONLY the JSON, no other text."""
+
+# Fully evaluated prompt head: each parse call is a single concatenation of
+# this constant with the resume text, no per-call formatting
+_PARSE_PROMPT_PREFIX = _PARSE_PROMPT_PREAMBLE + "\n\nResume Text:\n"
 
 class ResumeParserService:
     def __init__(self):
@@ -15,44 +110,171 @@ class ResumeParserService:
             endpoint=settings.azure_document_intelligence_endpoint,
             credential=AzureKeyCredential(settings.azure_document_intelligence_key)
         )
+        self.embedding_client = openai_client
+        # Bound concurrent Document Intelligence polls so an upload burst
+        # doesn't trip the service's rate limits; parse completions share
+        # the agents' cap
+        self.di_semaphore = asyncio.Semaphore(10)
+        self.llm_semaphore = AIAgentService.llm_semaphore
     
-    def extract_text_from_pdf(self, file_bytes: bytes) -> str:
-        """Fallback PDF text extraction"""
+    def _as_stream(self, document):
+        """Accept raw bytes or a seekable file object, return a stream positioned at 0"""
+        if isinstance(document, (bytes, bytearray)):
+            return io.BytesIO(document)
+        document.seek(0)
+        return document
+
+    def extract_text_from_pdf(self, document) -> str:
+        """Fallback PDF text extraction
+
+        pypdfium2 (PDFium's C++ text engine) first - typically an order of
+        magnitude faster than PyPDF2's pure-Python tokenizer - with PyPDF2
+        kept as a second-level fallback for PDFs PDFium chokes on.
+        """
         try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_bytes))
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            with _pdfium_lock:
+                pdf = pdfium.PdfDocument(self._as_stream(document))
+                try:
+                    text = "\n".join(
+                        page.get_textpage().get_text_range() for page in pdf
+                    )
+                finally:
+                    pdf.close()
+            if text.strip():
+                return text
+        except Exception as e:
+            logger.warning("pypdfium2 extraction error, trying PyPDF2: %s", e)
+
+        try:
+            # Sequential on purpose: all pages share one PdfReader and one
+            # stream, and PyPDF2 resolves indirect objects lazily by seeking
+            # that stream, so concurrent page extraction races on the stream
+            # position. This branch only runs when PDFium already failed.
+            pdf_reader = PyPDF2.PdfReader(self._as_stream(document))
+            return "\n".join(page.extract_text() for page in pdf_reader.pages)
         except Exception as e:
-            print(f"PDF extraction error: {e}")
+            logger.error("PDF extraction error: %s", e)
             return ""
-    
-    def extract_text_from_docx(self, file_bytes: bytes) -> str:
-        """Fallback DOCX text extraction"""
+
+    _DOCX_TEXT_TAG = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}t'
+
+    def extract_text_from_docx(self, document) -> str:
+        """Fallback DOCX text extraction
+
+        Reads word/document.xml straight out of the zip and walks the w:t
+        text nodes with lxml in one pass - no python-docx object model, and
+        it picks up text inside tables, which doc.paragraphs skips. Results
+        are cached by content digest.
+        """
         try:
-            doc = docx.Document(io.BytesIO(file_bytes))
-            text = "\n".join([para.text for para in doc.paragraphs])
+            digest = self._content_digest(document)
+            cached = _docx_text_cache.get(digest)
+            if cached is not None:
+                return cached
+
+            with zipfile.ZipFile(self._as_stream(document)) as archive:
+                xml_bytes = archive.read('word/document.xml')
+            root = etree.fromstring(xml_bytes, _DOCX_XML_PARSER)
+            text = "\n".join(
+                node.text for node in root.iter(self._DOCX_TEXT_TAG) if node.text
+            )
+            _docx_text_cache[digest] = text
             return text
         except Exception as e:
-            print(f"DOCX extraction error: {e}")
+            logger.error("DOCX extraction error: %s", e)
             return ""
-    
-    async def parse_resume(self, file_bytes: bytes, filename: str) -> ParsedResume:
-        """Parse resume using Azure Document Intelligence"""
-        try:
-            # Try Azure Document Intelligence first
-            poller = self.client.begin_analyze_document(
+
+    def _content_digest(self, document) -> str:
+        """blake2b digest of the document contents, read in chunks"""
+        hasher = hashlib.blake2b(digest_size=20)
+        stream = self._as_stream(document)
+        while chunk := stream.read(65536):
+            hasher.update(chunk)
+        return hasher.hexdigest()
+
+    async def _analyze_document(self, document):
+        """Run the Document Intelligence analyze + poll cycle
+
+        azure-core's default retry policy already backs off exponentially
+        on 429s and transient failures; the semaphore keeps us from
+        provoking them in the first place.
+        """
+        async with self.di_semaphore:
+            poller = await self.client.begin_analyze_document(
                 "prebuilt-document",
-                file_bytes
+                self._as_stream(document)
             )
-            result = poller.result()
+            return await poller.result()
+
+    async def close(self):
+        """Close the async Document Intelligence client - call from shutdown"""
+        await self.client.close()
+
+    async def parse_resume(self, document, filename: str) -> ParsedResume:
+        """Parse resume, skipping the expensive parse when the content was seen before
+
+        Accepts raw bytes or a seekable file object (e.g. SpooledTemporaryFile)
+        so uploads can be streamed to disk instead of buffered in memory.
+        """
+        digest = self._content_digest(document)
+        cached = _parse_cache.get(('resume', digest))
+        if cached is not None:
+            return cached
+
+        parsed = await self._parse_resume_uncached(document, filename)
+        _parse_cache[('resume', digest)] = parsed
+        return parsed
+
+    async def _local_raw_text(self, document, filename: str) -> str:
+        """Extract text locally (no Azure round-trip) on a worker thread"""
+        # Case-insensitive dispatch - validation upstream accepts RESUME.PDF
+        extension = os.path.splitext(filename)[1].lower()
+        if extension == '.pdf':
+            return await anyio.to_thread.run_sync(self.extract_text_from_pdf, document)
+        elif extension == '.docx':
+            return await anyio.to_thread.run_sync(self.extract_text_from_docx, document)
+
+        # Unknown extension: try both extractors concurrently and keep
+        # whichever got more text. Each thread gets its own bytes copy so
+        # they don't race on one shared stream position.
+        data = self._as_stream(document).read()
+        pdf_text, docx_text = await asyncio.gather(
+            anyio.to_thread.run_sync(self.extract_text_from_pdf, data),
+            anyio.to_thread.run_sync(self.extract_text_from_docx, data)
+        )
+        return max(pdf_text, docx_text, key=len)
+
+    async def _parse_resume_uncached(self, document, filename: str) -> ParsedResume:
+        """Parse resume using Azure Document Intelligence"""
+        if settings.prefer_local_extraction:
+            # Text-native documents extract locally in milliseconds; the DI
+            # analyze/poll round-trip only pays off for scanned or
+            # image-heavy files, which come back (near-)empty here
+            raw_text = await self._local_raw_text(document, filename)
+            if len(raw_text.strip()) > 500:
+                parsed_data = await self._parse_with_ai(raw_text)
+                return ParsedResume(
+                    name=parsed_data.get('name', 'Unknown'),
+                    email=parsed_data.get('email', ''),
+                    phone=parsed_data.get('phone'),
+                    skills=parsed_data.get('skills', []),
+                    education=parsed_data.get('education', []),
+                    experience=parsed_data.get('experience', []),
+                    raw_text=raw_text
+                )
+
+        try:
+            # Try Azure Document Intelligence first. The aio client awaits
+            # the poll cycle, so concurrent uploads overlap on the event loop
+            # instead of queueing behind each other.
+            result = await self._analyze_document(document)
             
-            # Extract text content
-            raw_text = ""
+            # Extract text content - buffer lines and join once instead of
+            # growing a string per line
+            parts = []
             for page in result.pages:
-                for line in page.lines:
-                    raw_text += line.content + "\n"
+                parts.extend(line.content for line in page.lines)
+            raw_text = "\n".join(parts)
             
             # Basic field extraction
             name = ""
@@ -77,11 +299,26 @@ class ResumeParserService:
             
             # If Document Intelligence doesn't extract well, use fallback
             if not raw_text:
-                if filename.endswith('.pdf'):
-                    raw_text = self.extract_text_from_pdf(file_bytes)
-                elif filename.endswith('.docx'):
-                    raw_text = self.extract_text_from_docx(file_bytes)
-            
+                raw_text = await self._local_raw_text(document, filename)
+
+            # Rule-first: when the key-value pass plus a regex scan already
+            # yield the contact fields, the LLM round-trip is skippable
+            if settings.llm_fallback_only:
+                if not email and (match := EMAIL_RE.search(raw_text)):
+                    email = match.group(0)
+                if not phone and (match := PHONE_RE.search(raw_text)):
+                    phone = match.group(0)
+                if name and email and phone:
+                    return ParsedResume(
+                        name=name,
+                        email=email,
+                        phone=phone,
+                        skills=skills,
+                        education=education,
+                        experience=[],
+                        raw_text=raw_text
+                    )
+
             # Use OpenAI to parse the resume text intelligently
             parsed_data = await self._parse_with_ai(raw_text)
             
@@ -96,13 +333,9 @@ class ResumeParserService:
             )
             
         except Exception as e:
-            print(f"Azure Document Intelligence error: {e}")
+            logger.error("Azure Document Intelligence error: %s", e)
             # Fallback to simple text extraction
-            raw_text = ""
-            if filename.endswith('.pdf'):
-                raw_text = self.extract_text_from_pdf(file_bytes)
-            elif filename.endswith('.docx'):
-                raw_text = self.extract_text_from_docx(file_bytes)
+            raw_text = await self._local_raw_text(document, filename)
             
             if raw_text:
                 parsed_data = await self._parse_with_ai(raw_text)
@@ -118,18 +351,122 @@ class ResumeParserService:
             
             raise Exception("Failed to parse resume")
     
+    async def _embed_text(self, text: str) -> Optional[np.ndarray]:
+        """Embed (truncated) resume text, pre-normalized; None on failure"""
+        try:
+            response = await self.embedding_client.embeddings.create(
+                model=settings.azure_openai_embedding_deployment,
+                input=[text[:8000]]
+            )
+            vector = np.array(response.data[0].embedding, dtype=np.float32)
+            return vector / np.linalg.norm(vector)
+        except Exception as e:
+            logger.warning("Resume embedding error: %s", e)
+            return None
+
     async def _parse_with_ai(self, text: str) -> dict:
+        """Parse resume text, reusing prior parses of the same or near-same text
+
+        Exact tier: digest of the normalized text. Semantic tier: cosine
+        search over embeddings of previously parsed resumes - a re-exported
+        or trivially edited resume reuses the stored parse instead of paying
+        the multi-second LLM call. A miss costs one embedding call.
+        """
+        text = _truncate_to_token_budget(text)
+        key = hashlib.blake2b(text.strip().encode(), digest_size=20).hexdigest()
+        entry = _text_parse_cache.get(key)
+        if entry is not None:
+            return entry["parsed"]
+
+        embedding = await self._embed_text(text)
+        if embedding is not None and _text_parse_cache:
+            candidates = [
+                e for e in _text_parse_cache.values() if e["embedding"] is not None
+            ]
+            if candidates:
+                vectors = np.stack([e["embedding"] for e in candidates])
+                similarities = vectors @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= _TEXT_SEMANTIC_THRESHOLD:
+                    return candidates[best]["parsed"]
+
+        parsed = await self._parse_with_ai_uncached(text)
+        _text_parse_cache[key] = {"embedding": embedding, "parsed": parsed}
+        return parsed
+
+    async def _parse_with_ai_uncached(self, text: str) -> dict:
         """Use OpenAI to intelligently parse resume text"""
-        from openai import AzureOpenAI
-        
-        client = AzureOpenAI(
-            azure_endpoint=settings.azure_openai_endpoint,
-            api_key=settings.azure_openai_api_key,
-            api_version=settings.azure_openai_api_version
+
+        # Static instructions first, variable resume text last: the prompt
+        # prefix stays byte-identical across calls, so provider-side prompt
+        # caching can cover the schema block.
+        prompt = _PARSE_PROMPT_PREFIX + text
+
+        try:
+            async with self.llm_semaphore:
+                response = await openai_client.chat.completions.create(
+                    model=settings.azure_openai_deployment,
+                    messages=[
+                        {"role": "system", "content": "You are a resume parser. Return only valid JSON."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.1,
+                    max_tokens=2000,
+                    response_format={"type": "json_object"}
+                )
+
+            # JSON mode guarantees a bare JSON object - no fence stripping
+            parsed = orjson.loads(response.choices[0].message.content)
+
+            if 'experience' in parsed:
+                parsed['experience'] = EXPERIENCE_LIST_ADAPTER.validate_python(
+                    parsed['experience']
+                )
+
+            return parsed
+            
+        except Exception as e:
+            logger.error("AI parsing error: %s", e)
+            return {
+                "name": "Unknown",
+                "email": "",
+                "phone": "",
+                "skills": [],
+                "education": [],
+                "experience": []
+            }
+
+    async def _extract_raw_text(self, document, filename: str) -> str:
+        """Get the raw text of one document: Document Intelligence, then local fallback"""
+        if settings.prefer_local_extraction:
+            raw_text = await self._local_raw_text(document, filename)
+            if len(raw_text.strip()) > 500:
+                return raw_text
+
+        try:
+            result = await self._analyze_document(document)
+            parts = []
+            for page in result.pages:
+                parts.extend(line.content for line in page.lines)
+            if parts:
+                return "\n".join(parts)
+        except Exception as e:
+            logger.error("Azure Document Intelligence error: %s", e)
+
+        return await self._local_raw_text(document, filename)
+
+    async def _parse_batch_with_ai(self, texts: List[str]) -> List[dict]:
+        """Parse several resume texts with one GPT call
+
+        The extraction instructions are identical per resume, so batching
+        amortizes the fixed prompt across the group. Falls back to one call
+        per resume if the batched response doesn't line up.
+        """
+        delimited = "\n\n".join(
+            f"<<<RESUME {i + 1}>>>\n{_truncate_to_token_budget(text)}"
+            for i, text in enumerate(texts)
         )
-        
-        prompt = f"""
-Extract the following information from this resume text and return ONLY valid JSON:
+        prompt = f"""Each resume below is delimited by <<<RESUME i>>>. For EACH resume, extract:
 
 {{
   "name": "full name",
@@ -147,63 +484,106 @@ Extract the following information from this resume text and return ONLY valid JS
   ]
 }}
 
-Resume Text:
-{text}
+Return ONLY valid JSON of the form {{"resumes": [...]}} with exactly {len(texts)} entries, in the same order as the input.
 
-Return ONLY the JSON, no other text.
+{delimited}
 """
-        
         try:
-            response = client.chat.completions.create(
-                model=settings.azure_openai_deployment,
-                messages=[
-                    {"role": "system", "content": "You are a resume parser. Return only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=2000
-            )
-            
-            import json
-            result_text = response.choices[0].message.content.strip()
-            # Remove markdown code blocks if present
-            if result_text.startswith('```'):
-                result_text = result_text.split('```')[1]
-                if result_text.startswith('json'):
-                    result_text = result_text[4:]
-            
-            parsed = json.loads(result_text)
-            
-            # Convert experience to ParsedExperience objects
-            if 'experience' in parsed:
-                parsed['experience'] = [
-                    ParsedExperience(**exp) for exp in parsed['experience']
-                ]
-            
-            return parsed
-            
+            async with self.llm_semaphore:
+                response = await openai_client.chat.completions.create(
+                    model=settings.azure_openai_deployment,
+                    messages=[
+                        {"role": "system", "content": "You are a resume parser. Return only valid JSON."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.1,
+                    max_tokens=2000 * len(texts),
+                    response_format={"type": "json_object"}
+                )
+            parsed = orjson.loads(response.choices[0].message.content)['resumes']
+            if len(parsed) != len(texts):
+                raise ValueError(
+                    f"Batched parse returned {len(parsed)} entries for {len(texts)} resumes"
+                )
+            # Validate inside the try: entries missing required experience
+            # fields should fall back per resume, not raise out of the batch
+            for entry in parsed:
+                if 'experience' in entry:
+                    entry['experience'] = EXPERIENCE_LIST_ADAPTER.validate_python(
+                        entry['experience']
+                    )
         except Exception as e:
-            print(f"AI parsing error: {e}")
-            return {
-                "name": "Unknown",
-                "email": "",
-                "phone": "",
-                "skills": [],
-                "education": [],
-                "experience": []
-            }
+            logger.warning("Batched AI parsing error, retrying per resume: %s", e)
+            return list(await asyncio.gather(*(self._parse_with_ai(t) for t in texts)))
 
-    async def parse_job_description(self, file_bytes: bytes, filename: str) -> str:
-        """Parse job description from PDF or DOCX file"""
+        return parsed
+
+    async def parse_resumes_batch(self, documents) -> List[ParsedResume]:
+        """Parse several (document, filename) pairs, sharing one GPT call per group
+
+        Text extraction runs fully in parallel; the per-resume GPT calls are
+        then collapsed into one batched call per max_parse_batch_size group.
+        Results land in the same content-digest cache as parse_resume.
+        """
+        results: List[ParsedResume] = [None] * len(documents)
+        pending = []
+        for index, (document, filename) in enumerate(documents):
+            digest = self._content_digest(document)
+            cached = _parse_cache.get(('resume', digest))
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append((index, document, filename, digest))
+
+        if not pending:
+            return results
+
+        raw_texts = await asyncio.gather(*(
+            self._extract_raw_text(document, filename)
+            for _, document, filename, _ in pending
+        ))
+
+        batch_size = max(1, settings.max_parse_batch_size)
+        parsed_entries = []
+        for start in range(0, len(raw_texts), batch_size):
+            parsed_entries.extend(
+                await self._parse_batch_with_ai(list(raw_texts[start:start + batch_size]))
+            )
+
+        for (index, _, _, digest), raw_text, parsed_data in zip(pending, raw_texts, parsed_entries):
+            resume = ParsedResume(
+                name=parsed_data.get('name', 'Unknown'),
+                email=parsed_data.get('email', ''),
+                phone=parsed_data.get('phone'),
+                skills=parsed_data.get('skills', []),
+                education=parsed_data.get('education', []),
+                experience=parsed_data.get('experience', []),
+                raw_text=raw_text
+            )
+            _parse_cache[('resume', digest)] = resume
+            results[index] = resume
+        return results
+
+    async def parse_job_description(self, document, filename: str) -> str:
+        """Parse job description from PDF or DOCX file (bytes or file object)"""
         try:
-            if filename.endswith('.pdf'):
-                return self.extract_text_from_pdf(file_bytes)
-            elif filename.endswith(('.docx', '.doc')):
-                return self.extract_text_from_docx(file_bytes)
+            digest = self._content_digest(document)
+            cached = _parse_cache.get(('jd', digest))
+            if cached is not None:
+                return cached
+
+            extension = os.path.splitext(filename)[1].lower()
+            if extension == '.pdf':
+                text = await anyio.to_thread.run_sync(self.extract_text_from_pdf, document)
+            elif extension in ('.docx', '.doc'):
+                text = await anyio.to_thread.run_sync(self.extract_text_from_docx, document)
             else:
                 raise ValueError(f"Unsupported file format: {filename}")
+
+            _parse_cache[('jd', digest)] = text
+            return text
         except Exception as e:
-            print(f"Job description parsing error: {e}")
+            logger.error("Job description parsing error: %s", e)
             raise Exception(f"Failed to parse job description: {str(e)}")
 
 resume_parser_service = ResumeParserService()
\ No newline at end of file